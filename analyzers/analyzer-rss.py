@@ -1,7 +1,9 @@
 from datetime import datetime
+import io
 import webbrowser
+from xml.etree.ElementTree import Element
 from feed import Article, ArticleData, FeedData
-from analyzers.util import download
+from analyzers.util import FetchContext, download, get_validators
 
 import dateutil.parser
 import defusedxml.ElementTree as defusxml
@@ -9,60 +11,105 @@ import defusedxml.ElementTree as defusxml
 from util import check_type
 
 
+ATOM = "{http://www.w3.org/2005/Atom}"
+
+
 def open_feed_uri_in_browser(article: Article):
     if article.uri is not None:
         webbrowser.open(article.uri)
 
 
-def atom_rss_analyzer(uri: str) -> tuple[FeedData, list[ArticleData]]:
+def atom_rss_analyzer(uri: str, context: FetchContext) -> tuple[FeedData, list[ArticleData]] | None:
     """Atom RSS data reader for the feed reader.
 
     The uri/author of an article is set to the first link/author tag found.
+    Returns None if the feed has not been modified since the fetch the context's meta is from.
+
+    The document is parsed as a stream, and each entry is processed as soon as it is read. Once an entry
+    is reached which is already stored with the same updated time, the rest of the entries are skipped.
     """
-    xml_feed = defusxml.fromstring(download(uri).text)  # type: ignore
+    response = download(uri, context)
+    if response is None:
+        return None
+    known = context.known_articles()
 
     feed = FeedData()
-    feed.meta = {}
-
-    # feed required
-    feed.title = check_type(str, xml_feed.find("{http://www.w3.org/2005/Atom}title").text)
+    feed.meta = get_validators(response)
     feed.updated = datetime.now()
-    feed.meta["updated"] = check_type(str, xml_feed.find("{http://www.w3.org/2005/Atom}updated").text)
-    feed.meta["id"] = check_type(str, xml_feed.find("{http://www.w3.org/2005/Atom}title").text)
 
     # feed recommended
     feed_author = "no author"
-    top_author = xml_feed.find("{http://www.w3.org/2005/Atom}author")
-    if top_author is not None:
-        feed_author = check_type(str, top_author.find("{http://www.w3.org/2005/Atom}name").text)
 
-    # articles
-    articles = []
-    xml_articles = xml_feed.findall("{http://www.w3.org/2005/Atom}entry")
-    for xml_article in xml_articles:
-        article = ArticleData()
+    articles: list[ArticleData] = []
+    reached_known = False
+    root: Element | None = None
+    depth = 0
+    for event, element in defusxml.iterparse(io.BytesIO(response.content), events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            depth += 1
+            continue
+
+        depth -= 1
+        # only handle elements which are direct children of the feed
+        if depth != 1 or root is None:
+            continue
+
+        if element.tag == f"{ATOM}entry":
+            if not reached_known:
+                article = atom_rss_entry(element, feed_author)
+                if article.identifier in known and known[article.identifier] == article.updated:
+                    reached_known = True
+                else:
+                    articles.append(article)
+
+        # feed required
+        elif element.tag == f"{ATOM}title":
+            feed.title = check_type(str, element.text)
+        elif element.tag == f"{ATOM}updated":
+            feed.meta["updated"] = check_type(str, element.text)
+        elif element.tag == f"{ATOM}id":
+            feed.meta["id"] = check_type(str, element.text)
+
+        elif element.tag == f"{ATOM}author":
+            feed_author = check_type(str, element.find(f"{ATOM}name").text)  # type: ignore
+
+        # drop the elements which were handled, so the whole document is never held in memory
+        root.clear()
+
+        if reached_known and "title" in vars(feed) and "updated" in feed.meta:
+            break
+
+    if "title" not in vars(feed) or "updated" not in feed.meta:
+        raise Exception("Feed is missing its title or updated time")
 
-        author = xml_article.find("{http://www.w3.org/2005/Atom}author")
-        if author is not None:
-            article.author = check_type(str, author.find("{http://www.w3.org/2005/Atom}name").text)
-        else:
-            article.author = feed_author
+    return feed, articles
 
-        # required for atom rss
-        article.identifier = check_type(str, xml_article.find("{http://www.w3.org/2005/Atom}id").text)
-        article.title = check_type(str, xml_article.find("{http://www.w3.org/2005/Atom}title").text)
-        article.updated = dateutil.parser.isoparse(check_type(str, xml_article.find("{http://www.w3.org/2005/Atom}updated").text))
 
-        # optional for atom rss
-        content = xml_article.find("{http://www.w3.org/2005/Atom}content")
-        article.content = check_type(str, content.text) if content is not None else ""
+def atom_rss_entry(xml_article: Element, feed_author: str) -> ArticleData:
+    """Reads an article from an entry element."""
+    article = ArticleData()
 
-        link = xml_article.find("{http://www.w3.org/2005/Atom}link")
-        article.uri = check_type(str, link.attrib["href"]) if content is not None else ""
+    author = xml_article.find(f"{ATOM}author")
+    if author is not None:
+        article.author = check_type(str, author.find(f"{ATOM}name").text)  # type: ignore
+    else:
+        article.author = feed_author
 
-        articles.append(article)
+    # required for atom rss
+    article.identifier = check_type(str, xml_article.find(f"{ATOM}id").text)  # type: ignore
+    article.title = check_type(str, xml_article.find(f"{ATOM}title").text)  # type: ignore
+    article.updated = dateutil.parser.isoparse(check_type(str, xml_article.find(f"{ATOM}updated").text))  # type: ignore
 
-    return feed, articles
+    # optional for atom rss
+    content = xml_article.find(f"{ATOM}content")
+    article.content = check_type(str, content.text) if content is not None else ""
+
+    link = xml_article.find(f"{ATOM}link")
+    article.uri = check_type(str, link.attrib["href"]) if link is not None else None
+
+    return article
 
 
 analyzers = {
@@ -1,11 +1,147 @@
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable
+from urllib.parse import urlsplit
+import hashlib
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
+
+
+class FetchError(Exception):
+    """Raised when a feed cannot be downloaded.
+
+    retry_after is the number of seconds the server asked to wait before trying again, if it did.
+    """
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+    def __reduce__(self):
+        return (FetchError, (str(self), self.retry_after))
+
+
+class Session(requests.Session):
+    """Long lived http session which keeps connections alive, and reuses them for each host.
+
+    Up to pool_size connections are kept open per host, for the pool_hosts most recently used hosts.
+    timeout is the (connect, read) timeout in seconds applied to every request made with the session.
+    The connection pools are thread safe, so one session is shared by every analyzer and fetch thread.
+    """
+
+    def __init__(self, pool_size: int = 10, pool_hosts: int = 100, timeout: tuple[float, float] = (10, 30)):
+        super().__init__()
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+        self.headers.update({
+            'User-Agent': 'python-feed-reader',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'})
+
+
+    def request(self, method: str | bytes, url: str | bytes, *args: Any, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, *args, **kwargs)
+
+
+class FetchContext:
+    """Passed to an analyzer along with the uri of the feed to fetch."""
+
+    def __init__(self,
+                 session: Session,
+                 meta: dict[str, Any] | None = None,
+                 prefetched: dict[str, requests.Response] | None = None,
+                 known_articles: Callable[[], dict[str, datetime]] | None = None):
+        self.session: Session = session
+        "The shared session all downloads should be made with."
+
+        self.meta: dict[str, Any] | None = meta
+        "The meta of the feed from its previous fetch, or None if it has not been fetched before."
+
+        self.prefetched: dict[str, requests.Response] = {} if prefetched is None else prefetched
+        "Responses already downloaded by the fetch engine, by uri. download uses these instead of the session."
 
-def download(uri: str) -> requests.Response:
-    """Download text file with the application's header."""
-    headers = {'User-Agent': 'python-feed-reader'}
+        self.known_articles: Callable[[], dict[str, datetime]] = known_articles if known_articles is not None else dict
+        "Returns the updated time of each article of the feed already stored, by identifier."
+
+
+def get_host(uri: str) -> str:
+    """Returns the host a feed is fetched from."""
+    return urlsplit(uri).hostname or ""
+
+
+def get_conditional_headers(meta: dict[str, Any] | None) -> dict[str, str]:
+    """Returns the headers which make a request conditional on the validators stored in a feed's meta."""
+    headers = {}
+    if meta is not None:
+        if "etag" in meta:
+            headers['If-None-Match'] = meta["etag"]
+        if "last_modified" in meta:
+            headers['If-Modified-Since'] = meta["last_modified"]
+    return headers
+
+
+def fetch(uri: str, session: Session, meta: dict[str, Any] | None = None) -> requests.Response:
+    """Requests a uri with the session, conditional on the validators in meta.
+
+    Unlike download, the response is returned even if the server reports it has not been modified.
+    """
     try:
-        request = requests.get(uri, headers=headers)
+        request = session.get(uri, headers=get_conditional_headers(meta))
         request.raise_for_status()
+    except requests.HTTPError as exc:
+        raise FetchError(f"Request feed error: {exc}", parse_retry_after(exc.response.headers.get("Retry-After"))) from exc
     except Exception as exc:
-        raise Exception(f"Request feed error: {exc if 'request' in locals() else 'cannot connect'}") from exc
+        raise FetchError(f"Request feed error: {exc if 'request' in locals() else 'cannot connect'}") from exc
+    return request
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Returns the number of seconds a Retry-After header asks to wait, or None if it is missing or invalid."""
+    if value is None:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def download(uri: str, context: FetchContext) -> requests.Response | None:
+    """Download text file using the context's session.
+
+    If the context's meta holds the etag or last_modified of a previous download of the uri, the request
+    is made conditional, and None is returned when the server reports that the file has not been modified.
+    None is also returned when the body is identical to the previous download, for servers which ignore
+    conditional requests.
+    """
+    if uri in context.prefetched:
+        request = context.prefetched[uri]
+    else:
+        request = fetch(uri, context.session, context.meta)
+    if request.status_code == 304:
+        return None
+    if context.meta is not None and context.meta.get("body_hash") == get_body_hash(request):
+        return None
     return request
+
+
+def get_body_hash(response: requests.Response) -> str:
+    """Returns a hash of the body of a response."""
+    return hashlib.blake2b(response.content, digest_size=16).hexdigest()
+
+
+def get_validators(response: requests.Response) -> dict[str, str]:
+    """Returns the cache validators of a response, to be stored in the feed's meta for the next download."""
+    validators = {"body_hash": get_body_hash(response)}
+    if "ETag" in response.headers:
+        validators["etag"] = response.headers["ETag"]
+    if "Last-Modified" in response.headers:
+        validators["last_modified"] = response.headers["Last-Modified"]
+    return validators
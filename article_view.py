@@ -1,11 +1,12 @@
-import operator
+from collections import OrderedDict
+from datetime import datetime
 import logging
 
 import PySide6.QtWidgets as qtw
 import PySide6.QtCore as qtc
 import PySide6.QtGui as qtg
 
-from feed import Feed, Article, apply_action
+from feed import Feed, Folder, Article, apply_action
 from feed_manager import FeedManager
 from settings import settings
 
@@ -14,17 +15,67 @@ QtModelIndex = qtc.QModelIndex | qtc.QPersistentModelIndex
 class ArticleFilter(qtw.QWidget):
     """A view for displaying articles, and a textbox for filtering them.
 
-    article_selected_event fires when an article is selected.
+    Typing in the textbox searches the articles of the current feed, of the folder it is in, or of all feeds.
+    Results are shown best matches first, until the view is sorted by a column. While articles stored
+    before the search index existed are added to it, the progress is shown next to the textbox.
     """
-    article_selected_event = qtc.Signal(str)
 
     def __init__(self, fm: FeedManager):
         super().__init__()
 
+        self.article_view = ArticleView(fm)
+
+        self.search_box = qtw.QLineEdit()
+        self.search_box.setPlaceholderText("Search articles")
+        self.search_box.setClearButtonEnabled(True)
+
+        self.scope_box = qtw.QComboBox()
+        self.scope_box.addItem("This feed", "feed")
+        self.scope_box.addItem("This folder", "folder")
+        self.scope_box.addItem("All feeds", "all")
+        self.scope_box.setItemData(1, "The folder the current feed is in", qtc.Qt.ToolTipRole)
+
+        # wait for typing to pause before searching
+        self.search_timer = qtc.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(300)
+        self.search_timer.timeout.connect(self.search)
+
+        self.index_label = qtw.QLabel()
+        self.index_label.hide()
+
+        self.search_box.textChanged.connect(self.search_timer.start)
+        self.scope_box.currentIndexChanged.connect(self.search)
+        fm.search_index_event.connect(self.show_index_progress)
+
+        search_layout = qtw.QHBoxLayout()
+        search_layout.setContentsMargins(0, 0, 0, 0)
+        search_layout.addWidget(self.search_box)
+        search_layout.addWidget(self.scope_box)
+        search_layout.addWidget(self.index_label)
+
         layout = qtw.QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(search_layout)
+        layout.addWidget(self.article_view)
         self.setLayout(layout)
 
 
+    def search(self) -> None:
+        """Shows the articles matching the text in the textbox, or all articles of the feed if it is empty."""
+        self.article_view.set_search(self.search_box.text().strip(), self.scope_box.currentData())
+
+
+    def show_index_progress(self, left: int, total: int) -> None:
+        """Shows how much of the search index has been built, or hides the progress once it is built."""
+        if left == 0:
+            self.index_label.hide()
+            return
+        self.index_label.setText(f"Indexing for search {(total - left) * 100 // total}%")
+        self.index_label.setToolTip("Search results do not include all articles until every article is indexed.")
+        self.index_label.show()
+
+
 class ArticleView(qtw.QTreeView):
     """A view for displaying articles.
 
@@ -41,6 +92,11 @@ class ArticleView(qtw.QTreeView):
         # the currently viewed feed
         self.current_feed: None | Feed = None
 
+        # the text being searched for, which shows search results instead of the feed's articles, and
+        # whether the current "feed", the "folder" it is in, or "all" feeds are searched
+        self.search_text = ""
+        self.search_scope = "feed"
+
         # model used by this treeview
         self.article_view_model = ArticleViewModel(self)
 
@@ -52,7 +108,8 @@ class ArticleView(qtw.QTreeView):
         # self.setAlternatingRowColors(True)
 
         self.feed_manager.article_updated_event.connect(self.article_view_model.update_article_data)
-        self.feed_manager.new_article_event.connect(self.article_view_model.new_article)
+        self.feed_manager.new_articles_event.connect(self.article_view_model.new_articles)
+        self.feed_manager.articles_marked_event.connect(self.article_view_model.mark_articles)
 
         self.setContextMenuPolicy(qtc.Qt.CustomContextMenu)
         self.customContextMenuRequested.connect(self.handle_article_context_menu)
@@ -65,18 +122,37 @@ class ArticleView(qtw.QTreeView):
         # self.header().setSectionResizeMode(2, qtw.QHeaderView.ResizeMode.ResizeToContents)
         self.setSortingEnabled(True)
         self.setRootIsDecorated(False)
+        self.setSelectionMode(qtw.QAbstractItemView.ExtendedSelection)
+        # otherwise the view reads every row to find its height, which loads every page of the model
+        self.setUniformRowHeights(True)
 
 
 
     def refresh(self) -> None:
         """Refreshes the data in the ArticleView using feed_manager."""
+        if self.search_text != "" and (self.search_scope == "all" or self.current_feed is not None):
+            scope: Feed | Folder | None = None
+            if self.search_scope == "feed":
+                scope = self.current_feed
+            elif self.search_scope == "folder":
+                scope = self.current_feed.parent_folder
+            self.article_view_model.set_articles(self.feed_manager.search(self.search_text, scope), ranked=True)
+            return
         if self.current_feed is None:
             self.article_view_model.set_articles([])
             return
-        self.article_view_model.set_articles(self.feed_manager.get_articles(self.current_feed.db_id))
+        self.article_view_model.set_feed(self.current_feed.db_id)
         return
 
 
+    def set_search(self, text: str, scope: str) -> None:
+        """Shows the articles matching text, from the current "feed", the "folder" it is in, or "all" feeds.
+        An empty text stops searching."""
+        self.search_text = text
+        self.search_scope = scope
+        self.refresh()
+
+
     def select_feed(self, feed: None | Feed = None) -> None:
         """Changes which feed's articles should be shown in the view.
 
@@ -93,13 +169,15 @@ class ArticleView(qtw.QTreeView):
         """
         index = self.currentIndex()
 
-        if index.isValid():
-            article: Article = index.internalPointer()
+        article = self.article_view_model.article(index.row()) if index.isValid() else None
+        if article is not None:
             if article.unread is True:
-                if self.current_feed is None:
-                    logging.error("current feed is none, but article was selected!")
+                # search results may be from a different feed than the current one
+                feed = self.feed_manager.find_feed(article.feed_id)
+                if feed is None:
+                    logging.error("feed of the selected article was not found!")
                     return
-                self.feed_manager.set_article_unread_status(self.current_feed, article, False)
+                self.feed_manager.set_article_unread_status(feed, article, False)
             self.article_selected_event.emit(article)
 
 
@@ -120,12 +198,26 @@ class ArticleView(qtw.QTreeView):
         """Outputs the context menu for items in the article view."""
         index = self.indexAt(mouse_position)
 
-        if self.current_feed is None:
+        article = self.article_view_model.article(index.row()) if index.isValid() else None
+        feed = self.feed_manager.find_feed(article.feed_id) if article is not None else None
+        if article is None or feed is None:
+            return
+
+        selected = self.selectionModel().selectedRows()
+        if len(selected) > 1 and self.selectionModel().isRowSelected(index.row()):
+            # acts on all the selected articles, with one write
+            menu = qtw.QMenu()
+            read_action = menu.addAction("Mark Selected Read")
+            unread_action = menu.addAction("Mark Selected Unread")
+            action = menu.exec(self.viewport().mapToGlobal(mouse_position))
+            if action in (read_action, unread_action):
+                articles = [self.article_view_model.article(row.row()) for row in selected]
+                self.feed_manager.set_articles_unread_status([article for article in articles if article is not None], action == unread_action)
+                self.article_view_model.update_all_data()
             return
 
         if index.isValid():
             menu = qtw.QMenu()
-            article: Article = index.internalPointer()
 
             if article.unread:
                 toggle_action = menu.addAction("Mark Read")
@@ -140,9 +232,9 @@ class ArticleView(qtw.QTreeView):
 
             if action == toggle_action:
                 if article.unread:
-                    self.feed_manager.set_article_unread_status(self.current_feed, article, False)
+                    self.feed_manager.set_article_unread_status(feed, article, False)
                 else:
-                    self.feed_manager.set_article_unread_status(self.current_feed, article, True)
+                    self.feed_manager.set_article_unread_status(feed, article, True)
                 self.article_view_model.update_row_unread_status(index)
             elif action == flag_action:
                 self.feed_manager.toggle_article_flag(article)
@@ -151,12 +243,12 @@ class ArticleView(qtw.QTreeView):
 
     def handle_double_click(self, index: qtc.QModelIndex) -> None:
 
-        if index.isValid():
+        article = self.article_view_model.article(index.row()) if index.isValid() else None
+        if article is not None:
             # menu = qtw.QMenu()
-            article: Article = index.internalPointer()
-
-            if self.current_feed:
-                apply_action(self.current_feed, article)
+            feed = self.feed_manager.find_feed(article.feed_id)
+            if feed is not None:
+                apply_action(feed, article)
 
 
     def restore(self):
@@ -189,7 +281,14 @@ class ArticleView(qtw.QTreeView):
 
 
 class ArticleViewModel(qtc.QAbstractItemModel):
-    """Item model which describes a list of articles."""
+    """Item model which describes a list of articles.
+
+    The articles of a feed are read from the database a page at a time, sorted by the database. Pages are
+    added to the model with fetchMore as the view scrolls down, and only the max_pages most recently
+    used pages are kept, so pages which were dropped are read again when they are scrolled back to.
+    A list of articles can be shown instead, such as search results, which is sorted in the model. Ranked
+    lists are shown in the order they are given until the view is sorted by a column.
+    """
 
     definedrows = {
         0: "Name",
@@ -197,11 +296,27 @@ class ArticleViewModel(qtc.QAbstractItemModel):
         2: "Updated"
     }
 
+    page_size = 200
+    max_pages = 5
+
     def __init__(self, view: ArticleView):
         qtc.QAbstractItemModel.__init__(self)
-        self.articles: list[Article] = []
         self.view = view
 
+        # the list of articles shown, or None if the articles of feed_id are shown
+        self.articles: list[Article] | None = []
+
+        self.feed_id: int | None = None
+        self.total_rows = 0
+        "The number of articles the feed has."
+        self.rows = 0
+        "The number of the feed's articles which have been added to the model by fetchMore."
+        self.pages: OrderedDict[int, list[Article]] = OrderedDict()
+        "Pages of the feed's articles by page number, least recently used first."
+
+        self.sort_column = "updated"
+        self.descending = True
+
 
     def rowCount(self, parent: QtModelIndex = qtc.QModelIndex()) -> int:
         """Returns the number of rows."""
@@ -210,14 +325,63 @@ class ArticleViewModel(qtc.QAbstractItemModel):
             return 0
 
         # must be the root index
-        return len(self.articles)
+        return len(self.articles) if self.articles is not None else self.rows
+
+
+    def canFetchMore(self, parent: QtModelIndex = qtc.QModelIndex()) -> bool:
+        """Returns whether the feed has more articles which have not been added to the model."""
+        return not parent.isValid() and self.articles is None and self.rows < self.total_rows
+
+
+    def fetchMore(self, parent: QtModelIndex = qtc.QModelIndex()) -> None:
+        """Adds the next page of the feed's articles to the model."""
+        if not self.canFetchMore(parent):
+            return
+        count = min(self.page_size, self.total_rows - self.rows)
+        self.beginInsertRows(qtc.QModelIndex(), self.rows, self.rows + count - 1)
+        self.rows += count
+        self.endInsertRows()
 
 
     def index(self, row: int, column: int, parent: QtModelIndex = qtc.QModelIndex()):
         """Returns QModelIndex for given row/column."""
         if not self.hasIndex(row, column, parent):
             return qtc.QModelIndex()
-        return self.createIndex(row, column, self.articles[row])
+        return self.createIndex(row, column)
+
+
+    def article(self, row: int) -> Article | None:
+        """Returns the article in a row, reading its page from the database if it is not loaded. Returns None
+        if there is no such article, such as when articles were deleted since the rows were added."""
+        if self.articles is not None:
+            return self.articles[row] if 0 <= row < len(self.articles) else None
+
+        if not 0 <= row < self.rows:
+            return None
+        number = row // self.page_size
+        if number in self.pages:
+            self.pages.move_to_end(number)
+        else:
+            self.load_page(number)
+        page = self.pages[number]
+        return page[row % self.page_size] if row % self.page_size < len(page) else None
+
+
+    def load_page(self, number: int) -> None:
+        """Reads a page of the feed's articles from the database, and drops the least recently used pages."""
+        assert self.feed_id is not None
+        feed_manager = self.view.feed_manager
+
+        # starting after the end of the previous page only reads the articles in this page
+        previous = self.pages.get(number - 1)
+        if previous is not None and len(previous) == self.page_size:
+            page = feed_manager.get_articles_page(self.feed_id, self.sort_column, self.descending, self.page_size, after=previous[-1])
+        else:
+            page = feed_manager.get_articles_page(self.feed_id, self.sort_column, self.descending, self.page_size, offset=number * self.page_size)
+
+        self.pages[number] = page
+        while len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
 
 
     def parent(self, _):
@@ -241,7 +405,10 @@ class ArticleViewModel(qtc.QAbstractItemModel):
         if not index.isValid():
             return None
 
-        article: Article = index.internalPointer()
+        article = self.article(index.row())
+        if article is None:
+            return None
+
         if role in (qtc.Qt.DisplayRole, qtc.Qt.ToolTipRole):
             if index.column() == 0:
                 return article.title
@@ -273,22 +440,46 @@ class ArticleViewModel(qtc.QAbstractItemModel):
 
     def sort(self, column: int, order: qtc.Qt.SortOrder = qtc.Qt.AscendingOrder):
         self.beginResetModel()
-        reverse = order == qtc.Qt.AscendingOrder
-        if column == 0:
-            self.articles.sort(key=lambda e: e.title, reverse=reverse)
-        elif column == 1:
-            self.articles.sort(key=lambda e: e.author, reverse=reverse)
-        elif column == 2:
-            self.articles.sort(key=lambda e: e.updated, reverse=reverse)
+        self.view.header().setSortIndicatorShown(True)
+        self.sort_column = ["title", "author", "updated"][column]
+        self.descending = order == qtc.Qt.AscendingOrder
+        if self.articles is not None:
+            self.articles.sort(key=lambda e: getattr(e, self.sort_column), reverse=self.descending)
+        else:
+            self.reset_pages()
         self.endResetModel()
 
 
-    def set_articles(self, articles: list[Article]) -> None:
+    def reset_pages(self) -> None:
+        """Drops the loaded pages of the feed's articles, and shows the first page again."""
+        self.pages.clear()
+        self.total_rows = self.view.feed_manager.count_articles(self.feed_id) if self.feed_id is not None else 0
+        self.rows = min(self.page_size, self.total_rows)
+
+
+    def set_articles(self, articles: list[Article], ranked: bool = False) -> None:
         """Resets whats in the display with new articles.
 
-        Causes unselecting.
+        If ranked is set, such as for search results, the articles are kept in the order given, and no column
+        is shown as sorted. Otherwise they are sorted by the sorted column. Causes unselecting.
         """
         self.articles = articles
+        self.feed_id = None
+        if ranked:
+            self.beginResetModel()
+            self.view.header().setSortIndicatorShown(False)
+            self.endResetModel()
+        else:
+            self.sort(self.view.header().sortIndicatorSection(), self.view.header().sortIndicatorOrder())
+
+
+    def set_feed(self, feed_id: int) -> None:
+        """Resets whats in the display with the articles of a feed, which are read as they are shown.
+
+        Causes unselecting.
+        """
+        self.articles = None
+        self.feed_id = feed_id
         self.sort(self.view.header().sortIndicatorSection(), self.view.header().sortIndicatorOrder())
 
 
@@ -306,28 +497,48 @@ class ArticleViewModel(qtc.QAbstractItemModel):
 
     def update_article_data(self, article: Article):
         """Updates an existing article in the model with data."""
-        if self.view.current_feed is not None and self.view.current_feed.db_id == article.feed_id:
-            i = next((i for i, v in enumerate(self.articles) if v.identifier == article.identifier), None)
-            if i is not None:
-                self.articles[i].__dict__ = article.__dict__
-                self.dataChanged.emit(self.index(i, 0), self.index(i, self.columnCount()))
-            else:
-                logging.error("Article was updated in manager, but not already in view")
+        if self.articles is None:
+            if self.feed_id == article.feed_id:
+                # the article may have moved, so the pages are read again
+                self.pages.clear()
+                if self.rows > 0:
+                    self.dataChanged.emit(self.index(0, 0), self.index(self.rows - 1, self.columnCount() - 1))
+            return
 
+        i = next((i for i, v in enumerate(self.articles) if v.identifier == article.identifier and v.feed_id == article.feed_id), None)
+        if i is not None:
+            self.articles[i] = article
+            self.dataChanged.emit(self.index(i, 0), self.index(i, self.columnCount() - 1))
 
-    def new_article(self, article: Article):
-        """Updates the model with a new article."""
-        if self.view.current_feed is not None and self.view.current_feed.db_id == article.feed_id:
-            if self.view.header().sortIndicatorOrder() == qtc.Qt.AscendingOrder:
-                operation = operator.gt
-            else:
-                operation = operator.lt
-            section = ["title", "author", "updated"][self.view.header().sortIndicatorSection()]
 
-            i = next((i for (i, v) in enumerate(self.articles) if operation(getattr(article, section), getattr(v, section))), len(self.articles))
-            self.beginInsertRows(qtc.QModelIndex(), i, i + 1)
-            self.articles.insert(i, article)
-            self.endInsertRows()
+    def new_articles(self, articles: list[Article]):
+        """Updates the model with new articles of a feed, which are already in the database. Search results are left as they are."""
+        if self.articles is not None or self.feed_id is None or articles[0].feed_id != self.feed_id:
+            return
+
+        self.total_rows += len(articles)
+        # the positions of all the articles are read at once. Only ones among the rows in the model are needed
+        positions = self.view.feed_manager.get_article_positions(
+            self.feed_id, self.sort_column, self.descending, {article.identifier for article in articles}, self.rows + len(articles))
+
+        # the rows after them move down, so the pages are read again
+        self.pages.clear()
+        for i in sorted(positions.values()):
+            if i <= self.rows:
+                self.beginInsertRows(qtc.QModelIndex(), i, i)
+                self.rows += 1
+                self.endInsertRows()
+
+
+    def mark_articles(self, feed_ids: list[int], before: datetime | None, status: bool):
+        """Sets the unread status of the loaded articles from feed_ids, which are older than before if it is not None."""
+        articles = self.articles if self.articles is not None else [article for page in self.pages.values() for article in page]
+        ids = set(feed_ids)
+        for article in articles:
+            if article.feed_id in ids and (before is None or article.updated < before):
+                article.unread = status
+        if self.rowCount() > 0:
+            self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, 0), [qtc.Qt.FontRole])
 
 
     def update_all_data(self):
@@ -0,0 +1,234 @@
+from __future__ import annotations
+import asyncio
+from datetime import datetime
+from functools import partial
+import logging
+import math
+import threading
+import time
+from typing import Any, Callable, Union
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from feed import ArticleData, Feed, FeedData, Folder, create_parse_pool, get_feed
+from analyzers.util import FetchError, get_conditional_headers, get_host, parse_retry_after
+from scheduler import RefreshSchedule
+from settings import Settings
+
+
+class AsyncUpdater:
+    """Fetches data for the feed manager on a schedule, using an asyncio event loop in its own thread.
+
+    An alternative to UpdateThread which does not block a thread for each download, and does not depend
+    on Qt. Downloads are made with aiohttp, bounded by settings.max_fetches at once and by
+    settings.max_host_fetches for each host. The analyzers then process the downloaded documents in the
+    loop's default executor, or in a pool of processes if settings.parse_processes is not 0.
+
+    Parameters
+    ----------
+
+    feeds
+        a Folder containing all the feeds that will be in the scheduler.
+
+    settings
+        the settings for the application.
+
+    data_downloaded
+        called with the feed, its new data, and its articles whenever a feed is downloaded. It is called
+        from the event loop thread, so it must be thread safe.
+
+    fetch_status
+        called with a feed when fetching it fails, or when a feed which was failing is fetched again. It is
+        called from the event loop thread, so it must be thread safe.
+
+    known_articles
+        returns the updated time of each stored article of a feed by identifier, given the feed's db_id.
+        It is called from the executor threads, so it must be thread safe.
+    """
+
+    def __init__(self,
+                 feeds: Folder,
+                 settings: Settings,
+                 data_downloaded: Callable[[Feed, FeedData, list[ArticleData]], Any],
+                 fetch_status: Callable[[Feed], Any],
+                 known_articles: Callable[[int], dict[str, datetime]]):
+
+        if aiohttp is None:
+            raise ImportError("aiohttp is required to use the asyncio fetch engine")
+
+        self.schedule = RefreshSchedule(feeds, settings)
+        self.feeds = feeds
+        self.settings = settings
+        self.data_downloaded = data_downloaded
+        self.fetch_status = fetch_status
+        self.known_articles = known_articles
+        self.parse_pool = create_parse_pool()
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self.main(),), name="AsyncUpdater", daemon=True)
+
+        # event loop state, only used in the event loop thread
+        self.wakeup = asyncio.Event()
+        self.stopping = False
+        self.queued: set[int] = set()
+        self.tasks: set[asyncio.Task[None]] = set()
+        self.fetch_slots = asyncio.BoundedSemaphore(self.settings.max_fetches)
+        self.host_slots: dict[str, asyncio.BoundedSemaphore] = {}
+        self.host_next_fetch: dict[str, float] = {}
+        self.http: aiohttp.ClientSession
+
+
+    def start(self) -> None:
+        """Starts the event loop thread."""
+        self.thread.start()
+
+
+    def stop(self) -> None:
+        """Stops the event loop, waiting a short time for it to exit."""
+        def set_stopping():
+            self.stopping = True
+            self.wakeup.set()
+
+        self.loop.call_soon_threadsafe(set_stopping)
+        self.thread.join(1)
+        if self.thread.is_alive():
+            logging.info("not enough time to stop async updater")
+
+
+    async def main(self) -> None:
+        """Runs the refresh schedule until stop is called."""
+        connector = aiohttp.TCPConnector(limit=self.settings.max_fetches, limit_per_host=self.settings.max_host_fetches)
+        timeout = aiohttp.ClientTimeout(sock_connect=10, sock_read=30)
+        headers = {'User-Agent': 'python-feed-reader', 'Accept-Encoding': 'gzip, deflate'}
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as self.http:
+            while not self.stopping:
+                # cleared before handling anything, so that no wakeup which happens while handling is missed
+                self.wakeup.clear()
+
+                for feed in self.schedule.pop_due():
+                    self.queue_feed(feed)
+
+                wake_time = self.schedule.next_time()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), None if wake_time == math.inf else max(0, wake_time - time.time()))
+                except asyncio.TimeoutError:
+                    pass
+
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown(wait=False, cancel_futures=True)
+
+
+    def queue_feed(self, feed: Feed) -> None:
+        """Starts a task to fetch the feed, unless it is already being fetched."""
+        if feed.db_id in self.queued:
+            return
+        self.queued.add(feed.db_id)
+        task = self.loop.create_task(self.update_feed(feed))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+
+    async def update_feed(self, feed: Feed) -> None:
+        """Gets data for a feed, and passes it to data_downloaded.
+
+        Waits for a free slot for the feed's host, then for one of the global fetch slots. Fetches from the
+        same host are started at least settings.global_refresh_rate seconds apart.
+        """
+        host = get_host(feed.uri)
+        try:
+            async with self.host_slots.setdefault(host, asyncio.BoundedSemaphore(self.settings.max_host_fetches)):
+                # reserve the next start time for this host before waiting for it
+                start = max(time.time(), self.host_next_fetch.get(host, 0))
+                self.host_next_fetch[host] = start + self.settings.global_refresh_rate
+                await asyncio.sleep(start - time.time())
+
+                async with self.fetch_slots:
+                    logging.debug(f"Fetching {feed.uri}")
+                    response = await self.download(feed.uri, feed.meta)
+
+            result = await self.loop.run_in_executor(
+                self.parse_pool, get_feed, feed.uri, feed.analyzer, feed.meta, {feed.uri: response}, partial(self.known_articles, feed.db_id))
+            if result is None:
+                logging.debug(f"{feed.uri} not modified")
+            else:
+                updated_feed, articles = result
+                self.data_downloaded(feed, updated_feed, articles)
+            if self.schedule.record_success(feed):
+                self.fetch_status(feed)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logging.error(f"Error parsing feed {feed.uri}, {exc}")
+            self.schedule.record_failure(feed, exc)
+            self.fetch_status(feed)
+        finally:
+            self.queued.discard(feed.db_id)
+
+
+    async def download(self, uri: str, meta: dict[str, Any] | None) -> requests.Response:
+        """Downloads a uri, and returns it as a requests Response so the analyzers can use it."""
+        try:
+            async with self.http.get(uri, headers=get_conditional_headers(meta)) as reply:
+                if reply.status >= 400:
+                    raise FetchError(f"Request feed error: {reply.status} {reply.reason} for url: {uri}",
+                                     parse_retry_after(reply.headers.get("Retry-After")))
+                body = await reply.read()
+        except FetchError:
+            raise
+        except Exception as exc:
+            raise FetchError(f"Request feed error: {exc}") from exc
+
+        response = requests.Response()
+        response.status_code = reply.status
+        response.url = str(reply.url)
+        response.headers = CaseInsensitiveDict(reply.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body  # type: ignore
+        return response
+
+
+    def force_refresh_folder(self, folder: Folder):
+        """Fetches all feeds in a folder recursively."""
+        for feed in folder:
+            self.loop.call_soon_threadsafe(self.queue_feed, feed)
+
+
+    def spread_refresh_folder(self, folder: Folder, window: float):
+        """Schedules all feeds in a folder to be refreshed within the next window seconds, spread out evenly."""
+        self.schedule.spread_refresh(list(folder), window)
+        self.loop.call_soon_threadsafe(self.wakeup.set)
+
+
+    def force_refresh_feed(self, feed: Feed):
+        """Fetches a feed."""
+        self.loop.call_soon_threadsafe(self.queue_feed, feed)
+
+
+    def update_global_refresh_rate(self, rate: int):
+        """Updates the global refresh rate to the new value."""
+        self.schedule.update_global_refresh_rate(rate)
+        self.loop.call_soon_threadsafe(self.wakeup.set)
+
+
+    def update_refresh_rate(self, feed: Feed, rate: Union[int, None]):
+        """Updates the feed's refresh rate to the new value."""
+        self.schedule.update_refresh_rate(feed, rate)
+        self.loop.call_soon_threadsafe(self.wakeup.set)
+
+
+    def remove_feed(self, feed: Feed) -> None:
+        """Removes an item from the refresh schedule."""
+        self.schedule.remove_feed(feed)
+        self.loop.call_soon_threadsafe(self.wakeup.set)
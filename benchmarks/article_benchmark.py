@@ -0,0 +1,49 @@
+"""Times creating articles from database rows, and measures the memory they take.
+
+Run from the repository root: python benchmarks/article_benchmark.py [number of articles]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import make_article
+from feed import Article
+import database
+
+
+def from_row(row) -> Article:
+    # the same as _article_from_row in the feed manager
+    return Article.stored(row['feed_id'], row['identifier'], row['uri'], row['title'],
+                          datetime.fromtimestamp(row['updated'], timezone.utc), row['author'], bool(row['unread']), bool(row['flag']))
+
+
+def main(count: int):
+    with tempfile.TemporaryDirectory() as directory:
+        connection = database.connect(os.path.join(directory, "articles.db"))
+        database.migrate(connection)
+        database.upsert_articles(connection, [make_article(i) for i in range(count)])
+
+        start = time.perf_counter()
+        rows = database.get_articles_page(connection, 0, "updated", True, count)
+        read = time.perf_counter() - start
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        articles = [from_row(row) for row in rows]
+        created = time.perf_counter() - start
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        connection.close()
+
+    print(f"reading {len(articles)} rows         {read * 1000:9.1f} ms")
+    print(f"creating {len(articles)} articles    {created * 1000:9.1f} ms  {created / count * 1e6:7.2f} us each")
+    print(f"memory of the articles       {size / 2**20:9.1f} MiB  {size / count:7.0f} bytes each")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
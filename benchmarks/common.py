@@ -0,0 +1,35 @@
+"""Helpers shared by the benchmarks. Each benchmark puts the repository root on sys.path before importing this."""
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from feed import Article, ArticleData
+
+
+def timed(name: str, count: int, function: Callable[[], Any]) -> float:
+    """Runs function once, prints the time it took in total and for each of count items, and returns it in seconds."""
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<36} {elapsed * 1000:9.1f} ms  {elapsed / count * 1e6:7.2f} us each")
+    return elapsed
+
+
+def make_article_data(i: int, feeds: int = 1, title: str | None = None, content: str = "") -> ArticleData:
+    """Returns the ith test article as an analyzer returns it, from one of feeds feeds."""
+    data = ArticleData()
+    data.feed_id = i % feeds
+    data.identifier = f"article-{i}"
+    data.uri = f"https://example.com/{i}"
+    data.title = title if title is not None else f"Article {i}"
+    data.updated = datetime.fromtimestamp(1600000000 + i, timezone.utc)
+    data.author = f"author {i % 30}"
+    data.content = content
+    data.unread = True
+    data.flag = False
+    return data
+
+
+def make_article(i: int, feeds: int = 1, title: str | None = None, content: str = "") -> Article:
+    """Returns the ith test article, see make_article_data."""
+    return Article(make_article_data(i, feeds, title, content))
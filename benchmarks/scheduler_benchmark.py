@@ -0,0 +1,52 @@
+"""Times the refresh schedule with many feeds.
+
+Run from the repository root: python benchmarks/scheduler_benchmark.py [number of feeds]
+"""
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import timed
+from feed import Feed, Folder
+from scheduler import IndexedHeap, RefreshSchedule
+from settings import settings
+
+
+def check_order(heap: IndexedHeap[int, None]):
+    times = [heap.pop()[2] for _ in range(len(heap))]
+    assert times == sorted(times), "entries came out of the heap out of order"
+
+
+def main(count: int):
+    random.seed(0)
+    # a copy of the settings, so that changing them does not write the settings file
+    config = SimpleNamespace(**{**vars(settings), "adaptive_refresh": False, "refresh_time": 600})
+
+    root = Folder("root")
+    for i in range(count):
+        feed = Feed(root)
+        feed.db_id = i
+        feed.refresh_rate = random.randint(60, 86400)
+        root.children.append(feed)
+    feeds: list[Feed] = list(root)
+
+    print(f"{count} feeds")
+    schedule = RefreshSchedule(root, config)  # type: ignore
+    timed("create schedule", count, lambda: RefreshSchedule(root, config))  # type: ignore
+    timed("reschedule every feed", count, lambda: [schedule.update_refresh_rate(feed, random.randint(60, 86400)) for feed in feeds])
+    timed("update global refresh", 1000, lambda: [schedule.update_global_refresh_rate(random.randint(60, 3600)) for _ in range(1000)])
+    timed("remove every feed", count, lambda: [schedule.remove_feed(feed) for feed in feeds])
+    assert len(schedule.entries) == 1
+
+    heap: IndexedHeap[int, None] = IndexedHeap()
+    timed("heap push", count, lambda: [heap.push(i, None, random.random()) for i in range(count)])
+    timed("heap reschedule", count, lambda: [heap.push(i, None, random.random()) for i in range(count)])
+    timed("heap remove half", count // 2, lambda: [heap.remove(i) for i in range(0, count, 2)])
+    timed("heap pop all", count // 2, lambda: check_order(heap))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
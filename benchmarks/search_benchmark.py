@@ -0,0 +1,96 @@
+"""Times building the full text search index, keeping it up to date with each prefix index, and searching it.
+
+Run from the repository root: python benchmarks/search_benchmark.py [number of articles]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import make_article
+from feed import Article
+import database
+
+
+random.seed(0)
+WORDS = ["".join(random.choices("abcdefghijklmnopqrstuvwxyz", k=random.randint(3, 10))) for _ in range(20000)]
+
+
+def make_search_article(i: int) -> Article:
+    """Returns the ith test article, with a title and content of random words."""
+    return make_article(i, feeds=1000, title=" ".join(random.choices(WORDS[:2000], k=8)),
+                        content="<p>" + " ".join(random.choices(WORDS, k=150)) + "</p>")
+
+
+def timed_query(connection, text: str, feed_ids: list[int] | None, runs: int = 20):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        results = database.search_articles(connection, text, feed_ids, 50)
+        times.append(time.perf_counter() - start)
+    scope = "all feeds" if feed_ids is None else f"{len(feed_ids)} feeds"
+    print(f"{text!r:<24} {scope:<10} {len(results):3} results  median {statistics.median(times) * 1000:7.2f} ms  max {max(times) * 1000:7.2f} ms")
+
+
+def main(count: int):
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as directory:
+        connection = database.connect(os.path.join(directory, "articles.db"))
+        database.migrate(connection)
+
+        print(f"{count} articles")
+        start = time.perf_counter()
+        for batch in range(0, count, 1000):
+            database.upsert_articles(connection, [make_search_article(i) for i in range(batch, min(batch + 1000, count))])
+        print(f"ingest, with the index kept up to date: {time.perf_counter() - start:.1f} s")
+
+        # the same as the ingest thread does for a database which had articles before the index existed
+        start = time.perf_counter()
+        with connection:
+            connection.execute('''DROP TRIGGER article_search_delete''')
+            connection.execute('''DROP TABLE article_search''')
+            connection.execute('''DROP TABLE search_backlog''')
+            database._create_search_index(connection)  # type: ignore
+        while True:
+            with connection:
+                if database.index_articles(connection, 100) is None:
+                    break
+        print(f"index build from scratch: {time.perf_counter() - start:.1f} s")
+
+        common, rare = WORDS[5], WORDS[19999]
+        timed_query(connection, common, None)
+        timed_query(connection, rare, None)
+        timed_query(connection, common[:2], None)
+        timed_query(connection, common[:3], None)
+        timed_query(connection, f"{common} {WORDS[7]}", None)
+        timed_query(connection, common, [7])
+        timed_query(connection, common, list(range(100)))
+        connection.close()
+
+        prefix_ingest(directory, min(count, 10000))
+
+
+def prefix_ingest(directory: str, count: int):
+    """Times ingesting articles with each choice of prefix index."""
+    articles = [make_search_article(i) for i in range(count)]
+    print(f"\ningesting {count} articles")
+    for prefix in ("", "3", "2 3"):
+        connection = database.connect(os.path.join(directory, f"prefix{prefix.replace(' ', '')}.db"))
+        database.migrate(connection)
+        with connection:
+            connection.execute('''DROP TABLE article_search''')
+            connection.execute(f'''CREATE VIRTUAL TABLE article_search USING fts5(title, author, content,
+                tokenize = 'unicode61 remove_diacritics 2'{f", prefix = '{prefix}'" if prefix else ""})''')
+        start = time.perf_counter()
+        for batch in range(0, count, 1000):
+            database.upsert_articles(connection, articles[batch:batch + 1000])
+        print(f"prefix {prefix or 'none':<5} {time.perf_counter() - start:6.1f} s")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,35 @@
+"""Times creating articles with and without checking their types, and the type checks themselves.
+
+Run from the repository root: python benchmarks/validation_benchmark.py [number of articles]
+"""
+import os
+import sys
+from typing import Any
+
+from typeguard import check_type as typeguard_check_type
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import make_article_data, timed
+from feed import Article
+from util import check_type
+
+
+def main(count: int):
+    rows = [make_article_data(i, feeds=100) for i in range(count)]
+
+    print(f"creating {count} articles")
+    checked = timed("checked (analyzer output)", count, lambda: [Article(data) for data in rows])
+    unchecked = timed("unchecked", count, lambda: [Article(data, validate=False) for data in rows])
+    stored = timed("stored (database rows)", count, lambda: [Article.stored(data.feed_id, data.identifier, data.uri, data.title, data.updated,
+                                                                            data.author, data.unread, data.flag) for data in rows])
+    print(f"unchecked is {checked / unchecked:.1f}x faster, stored is {checked / stored:.1f}x faster")
+
+    print(f"\n{count} type checks")
+    for check, value in ((str, "title"), (str | None, None), (dict[str, Any], {"a": 1})):
+        timed(f"typeguard {check}", count, lambda: [typeguard_check_type(str(check), value, check) for _ in range(count)])
+        timed(f"check_type {check}", count, lambda: [check_type(check, value) for _ in range(count)])
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
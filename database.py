@@ -0,0 +1,734 @@
+from contextlib import contextmanager
+import html
+import json
+import os
+import queue
+import itertools
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterator, Union
+from urllib.request import pathname2url
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from feed import Article, Feed, Folder
+
+
+_readers = threading.local()
+
+
+ZLIB = 0
+ZSTD = 1
+"Codecs article content can be compressed with. zstd is used for new content when zstandard is installed."
+
+
+PRAGMAS: dict[str, str | int] = {
+    "synchronous": "NORMAL",  # safe with WAL, only the last transactions can be lost on power failure
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -16 * 1024,  # in KiB
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,  # in milliseconds
+}
+"""Pragmas set on every connection."""
+
+
+def compress_content(content: str) -> tuple[int, bytes]:
+    """Returns the codec used and the compressed bytes of an article's content."""
+    if zstandard is not None:
+        return ZSTD, zstandard.ZstdCompressor().compress(content.encode("utf-8"))
+    return ZLIB, zlib.compress(content.encode("utf-8"))
+
+
+def decompress_content(codec: int, data: bytes) -> str:
+    """Returns an article's content from its codec and compressed bytes."""
+    if codec == ZSTD:
+        if zstandard is None:
+            raise ImportError("zstandard is required to read article content which was compressed with it")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    return zlib.decompress(data).decode("utf-8")
+
+
+def plain_text(content: str) -> str:
+    """Returns the text of an article's html content, for the search index."""
+    return html.unescape(re.sub(r"<[^>]*>", " ", content))
+
+
+def _move_content(connection: sqlite3.Connection) -> None:
+    """Migration which moves the content of articles to the article_content table, compressed."""
+    connection.execute('''
+        CREATE TABLE article_content (
+            article_id INTEGER PRIMARY KEY,
+            codec INTEGER NOT NULL,
+            data BLOB NOT NULL)''')
+
+    connection.executemany(
+        '''INSERT INTO article_content (article_id, codec, data) VALUES (?, ?, ?)''',
+        ((row[0], *compress_content(row[1])) for row in connection.execute('''SELECT id, content FROM articles WHERE content IS NOT NULL''')))
+
+    connection.execute('''ALTER TABLE articles DROP COLUMN content''')
+    connection.execute('''
+        CREATE TRIGGER article_content_delete AFTER DELETE ON articles BEGIN
+            DELETE FROM article_content WHERE article_id = old.id;
+        END''')
+
+
+def _create_search_index(connection: sqlite3.Connection) -> None:
+    """Migration which creates the full text search index of articles, ranked by matches in the title, then
+    the author, then the content.
+
+    Indexing takes about half a millisecond per article, so the articles which are already stored are not
+    indexed here. They are recorded in search_backlog, and added to the index a few at a time by the ingest
+    thread, see index_articles."""
+    # a prefix index of 3 characters keeps searching for unfinished words fast. Ingesting 10k articles took
+    # 5.1 s with no prefix index, 8.9 s with this one, and 10.6 s with one for 2 characters as well, which
+    # only made searching for 2 characters faster, see benchmarks/search_benchmark.py
+    connection.execute('''CREATE VIRTUAL TABLE article_search USING fts5(title, author, content, tokenize = 'unicode61 remove_diacritics 2', prefix = '3')''')
+    connection.execute('''INSERT INTO article_search (article_search, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0)')''')
+
+    connection.execute('''
+        CREATE TABLE search_backlog (
+            next_id INTEGER NOT NULL,
+            last_id INTEGER NOT NULL,
+            total INTEGER NOT NULL)''')
+    connection.execute('''INSERT INTO search_backlog SELECT min(id), max(id), count(*) FROM articles HAVING count(*) > 0''')
+
+    connection.execute('''
+        CREATE TRIGGER article_search_delete AFTER DELETE ON articles BEGIN
+            DELETE FROM article_search WHERE rowid = old.id;
+        END''')
+
+
+def index_articles(connection: sqlite3.Connection, limit: int) -> tuple[int, int] | None:
+    """Adds at most limit of the articles in search_backlog to the search index, see _create_search_index.
+
+    Returns the number of articles which are left to index and the number there were to begin with, or
+    None if there were none left. Articles are read as they are now, so ones which were updated since the
+    backlog was made, and are in the index already, are indexed the same again."""
+    backlog = connection.execute('''SELECT next_id, last_id, total FROM search_backlog''').fetchone()
+    if backlog is None:
+        return None
+
+    rows = connection.execute(
+        '''
+        SELECT id, title, author, codec, data FROM articles LEFT JOIN article_content ON article_id = id
+        WHERE id BETWEEN ? AND ? ORDER BY id LIMIT ?''', [backlog['next_id'], backlog['last_id'], limit]).fetchall()
+    connection.executemany(
+        '''INSERT OR REPLACE INTO article_search (rowid, title, author, content) VALUES (?, ?, ?, ?)''',
+        ((row['id'], row['title'], row['author'], plain_text(decompress_content(row['codec'], row['data'])) if row['codec'] is not None else "")
+         for row in rows))
+
+    next_id = rows[-1]['id'] + 1 if rows else backlog['last_id'] + 1
+    left = connection.execute('''SELECT count(*) FROM articles WHERE id BETWEEN ? AND ?''', [next_id, backlog['last_id']]).fetchone()[0]
+    if left == 0:
+        connection.execute('''DELETE FROM search_backlog''')
+    else:
+        connection.execute('''UPDATE search_backlog SET next_id = ?''', [next_id])
+    return left, backlog['total']
+
+
+FEEDS_FILE = "data/feeds.json"
+"Where feeds and folders were stored before they were stored in the database, see _create_feed_tables."
+
+
+def _create_feed_tables(connection: sqlite3.Connection) -> None:
+    """Migration which creates the tables of feeds and folders, and imports them from FEEDS_FILE if it exists.
+
+    The children of a folder are sorted by position, which is shared by the feeds and folders in it. The
+    root folder is not stored, and the feeds and folders in it have no parent."""
+    connection.execute('''
+        CREATE TABLE folders (
+            id INTEGER PRIMARY KEY,
+            parent_id INTEGER,
+            position INTEGER NOT NULL,
+            title TEXT NOT NULL)''')
+    connection.execute('''
+        CREATE TABLE feeds (
+            id INTEGER PRIMARY KEY,
+            folder_id INTEGER,
+            position INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            uri TEXT NOT NULL,
+            analyzer TEXT NOT NULL,
+            updated TEXT NOT NULL,
+            meta TEXT NOT NULL,
+            user_title TEXT,
+            refresh_rate INTEGER,
+            ignore_new BOOLEAN NOT NULL,
+            delete_time INTEGER,
+            max_articles INTEGER,
+            failures INTEGER NOT NULL,
+            retry_time FLOAT NOT NULL,
+            last_error TEXT)''')
+    connection.execute('''CREATE INDEX folders_parent ON folders (parent_id)''')
+    connection.execute('''CREATE INDEX feeds_folder ON feeds (folder_id)''')
+
+    if not os.path.exists(FEEDS_FILE):
+        return
+    with open(FEEDS_FILE, "rb") as feeds_file:
+        nodes: list[dict[str, Any]] = json.loads(feeds_file.read().decode("utf-8"))
+
+    folder_ids = itertools.count(1)
+
+    def import_node(node: dict[str, Any], parent: Folder) -> None:
+        # parents are written before their children, so positions are given out in the order of the file
+        if "children" in node:
+            folder = Folder(node["title"], parent)
+            folder.db_id = next(folder_ids)
+            connection.execute(*insert_folder_statement(folder))
+            for child in node["children"]:
+                import_node(child, folder)
+        else:
+            node["updated"] = datetime.fromisoformat(node["updated"]) if node["updated"] is not None else datetime.fromtimestamp(0)
+            # the file may have been edited, so its values are checked
+            feed = Feed(parent)
+            feed.update(node)
+            connection.execute(*insert_feed_statement(feed))
+
+    root = Folder("root")
+    for node in nodes:
+        import_node(node, root)
+
+
+MIGRATIONS: list[Union[str, Callable[[sqlite3.Connection], None]]] = [
+    # 1: the original articles table
+    '''
+    CREATE TABLE IF NOT EXISTS articles (
+        feed_id INTEGER,
+        identifier TEXT,
+        uri TEXT,
+        title TEXT,
+        updated FLOAT,
+        author TEXT,
+        content TEXT,
+        unread BOOLEAN,
+        flag BOOLEAN);
+    ''',
+
+    # 2: give articles a primary key, and make identifiers unique within a feed. Of duplicated articles
+    # the most recently updated one is kept, flagged if any of the duplicates were.
+    '''
+    CREATE TABLE articles_new (
+        id INTEGER PRIMARY KEY,
+        feed_id INTEGER,
+        identifier TEXT,
+        uri TEXT,
+        title TEXT,
+        updated FLOAT,
+        author TEXT,
+        content TEXT,
+        unread BOOLEAN,
+        flag BOOLEAN,
+        UNIQUE (feed_id, identifier));
+
+    INSERT INTO articles_new (feed_id, identifier, uri, title, updated, author, content, unread, flag)
+        SELECT feed_id, identifier, uri, title, updated, author, content, unread, any_flag FROM (
+            SELECT *,
+                row_number() OVER duplicates AS n,
+                max(flag) OVER (PARTITION BY feed_id, identifier) AS any_flag
+            FROM articles
+            WINDOW duplicates AS (PARTITION BY feed_id, identifier ORDER BY updated DESC, rowid DESC))
+        WHERE n = 1
+        ORDER BY updated;
+
+    DROP TABLE articles;
+    ALTER TABLE articles_new RENAME TO articles;
+    ''',
+
+    # 3: indexes for listing a feed's articles, counting unread articles, and finding flagged articles
+    '''
+    CREATE INDEX articles_feed_updated ON articles (feed_id, updated);
+    CREATE INDEX articles_feed_unread ON articles (feed_id, unread);
+    CREATE INDEX articles_flag ON articles (flag);
+    ''',
+
+    # 4: article counts for each feed, kept up to date by triggers
+    '''
+    CREATE TABLE feed_stats (
+        feed_id INTEGER PRIMARY KEY,
+        total INTEGER NOT NULL DEFAULT 0,
+        unread INTEGER NOT NULL DEFAULT 0,
+        flagged INTEGER NOT NULL DEFAULT 0);
+
+    INSERT INTO feed_stats (feed_id, total, unread, flagged)
+        SELECT feed_id, count(*), total(unread = 1), total(flag = 1) FROM articles GROUP BY feed_id;
+
+    CREATE TRIGGER feed_stats_insert AFTER INSERT ON articles BEGIN
+        INSERT INTO feed_stats (feed_id, total, unread, flagged) VALUES (new.feed_id, 1, new.unread = 1, new.flag = 1)
+        ON CONFLICT (feed_id) DO UPDATE
+        SET total = total + 1, unread = unread + excluded.unread, flagged = flagged + excluded.flagged;
+    END;
+
+    CREATE TRIGGER feed_stats_delete AFTER DELETE ON articles BEGIN
+        UPDATE feed_stats
+        SET total = total - 1, unread = unread - (old.unread = 1), flagged = flagged - (old.flag = 1)
+        WHERE feed_id = old.feed_id;
+    END;
+
+    CREATE TRIGGER feed_stats_update AFTER UPDATE OF unread, flag ON articles
+    WHEN (old.unread = 1) != (new.unread = 1) OR (old.flag = 1) != (new.flag = 1) BEGIN
+        UPDATE feed_stats
+        SET unread = unread - (old.unread = 1) + (new.unread = 1), flagged = flagged - (old.flag = 1) + (new.flag = 1)
+        WHERE feed_id = new.feed_id;
+    END;
+    ''',
+
+    # 5: content of articles in its own table, compressed
+    _move_content,
+
+    # 6: full text search of articles
+    _create_search_index,
+
+    # 7: indexes for reading a feed's articles a page at a time, sorted by any column, see get_articles_page
+    '''
+    DROP INDEX articles_feed_updated;
+    CREATE INDEX articles_feed_updated ON articles (feed_id, updated, identifier);
+    CREATE INDEX articles_feed_title ON articles (feed_id, title, identifier);
+    CREATE INDEX articles_feed_author ON articles (feed_id, author, identifier);
+    ''',
+
+    # 8: pages freed by deleting articles can be returned to the file system a few at a time, see incremental_vacuum
+    '''
+    PRAGMA auto_vacuum = INCREMENTAL;
+    ''',
+
+    # 9: feeds and folders in the database rather than in FEEDS_FILE
+    _create_feed_tables,
+]
+"""Scripts or functions which bring the database from each schema version to the next. Version n is reached
+by running the nth one. Add new ones to the end, and never change ones which have been released."""
+
+VACUUM_AFTER: set[int] = {5, 8}
+"Versions reached by migrations which free a lot of space or change how it is stored, after which the database is vacuumed."
+
+
+def migrate(connection: sqlite3.Connection) -> None:
+    """Upgrades the database to the newest schema version, running each migration it has not had yet.
+
+    Each migration runs in its own transaction together with the update to schema_version, so a failed
+    migration leaves the database at the previous version."""
+    with connection:
+        connection.execute('''CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)''')
+        if connection.execute('''SELECT count(*) FROM schema_version''').fetchone()[0] == 0:
+            connection.execute('''INSERT INTO schema_version VALUES (0)''')
+
+    version: int = connection.execute('''SELECT version FROM schema_version''').fetchone()[0]
+    for number, script in enumerate(MIGRATIONS[version:], version + 1):
+        try:
+            if callable(script):
+                connection.execute('''BEGIN''')
+                script(connection)
+                connection.execute('''UPDATE schema_version SET version = ?''', [number])
+                connection.commit()
+            else:
+                connection.executescript(f"BEGIN; {script} UPDATE schema_version SET version = {number}; COMMIT;")
+        except Exception:
+            connection.rollback()
+            raise
+
+    if VACUUM_AFTER & set(range(version + 1, len(MIGRATIONS) + 1)):
+        connection.execute('''VACUUM''')
+
+
+def connect(db_file: str, read_only: bool = False, shared_cache: bool = False, check_same_thread: bool = True) -> sqlite3.Connection:
+    """Opens a connection to the database with the pragmas in PRAGMAS set.
+
+    Connections which are not read only put the database in WAL mode, so that reading never waits for
+    writing. Read only connections can not write or change the journal mode, and need the database to
+    exist already. If shared_cache is set, connections in the process share one page cache.
+    """
+    uri = f"file:{pathname2url(os.path.abspath(db_file))}?mode={'ro' if read_only else 'rwc'}"
+    if shared_cache:
+        uri += "&cache=shared"
+
+    connection = sqlite3.connect(uri, uri=True, check_same_thread=check_same_thread)
+    connection.row_factory = sqlite3.Row
+    if not read_only:
+        connection.execute('''PRAGMA journal_mode = WAL''')
+    for name, value in PRAGMAS.items():
+        connection.execute(f"PRAGMA {name} = {value}")
+    return connection
+
+
+class ReaderPool:
+    """A fixed number of read only connections to the database, which can be used from any thread.
+
+    Parameters
+    ----------
+
+    db_file
+        the path of the database.
+
+    size
+        the number of connections.
+
+    shared_cache
+        whether the connections share one page cache.
+    """
+
+    def __init__(self, db_file: str, size: int, shared_cache: bool = False):
+        self.size = size
+        self.connections: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        for _ in range(size):
+            self.connections.put(connect(db_file, read_only=True, shared_cache=shared_cache, check_same_thread=False))
+
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrows a connection, waiting for one to be free if they are all in use."""
+        connection = self.connections.get()
+        try:
+            yield connection
+        finally:
+            self.connections.put(connection)
+
+
+    def close(self) -> None:
+        """Closes all the connections, waiting for the borrowed ones to be returned."""
+        for _ in range(self.size):
+            self.connections.get().close()
+
+
+def get_reader(db_file: str) -> sqlite3.Connection:
+    """Returns a read only connection to the database which belongs to the calling thread."""
+    if not hasattr(_readers, "connection"):
+        _readers.connection = connect(db_file, read_only=True)
+    return _readers.connection
+
+
+def upsert_articles(connection: sqlite3.Connection, articles: list[Article]) -> tuple[int, int]:
+    """Adds articles to the database, which may be from any number of feeds, in a single transaction.
+
+    An article which is already stored for its feed replaces the stored one if it was updated more
+    recently, and is marked unread again. Returns the number of articles inserted and updated.
+    """
+    with connection:
+        # articles get the next id after the largest one, so the ones with larger ids were inserted
+        last_id = connection.execute('''SELECT ifnull(max(id), 0) FROM articles''').fetchone()[0]
+
+        # RETURNING only gives the id of articles which were inserted or updated, not ones which were skipped
+        # because they have not changed. executemany can not return rows, so each article is executed on its own
+        written: list[tuple[int, Article]] = []
+        for article in articles:
+            row = connection.execute(
+                '''
+                INSERT INTO articles (feed_id, identifier, uri, title, updated, author, unread, flag)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (feed_id, identifier) DO UPDATE
+                SET uri = excluded.uri,
+                title = excluded.title,
+                updated = excluded.updated,
+                author = excluded.author,
+                unread = excluded.unread
+                WHERE excluded.updated > articles.updated
+                RETURNING id''',
+                [article.feed_id, article.identifier, article.uri, article.title, article.updated.timestamp(), article.author,
+                 article.unread, article.flag]).fetchone()
+            if row is not None:
+                written.append((row[0], article))
+        inserted = sum(1 for article_id, _ in written if article_id > last_id)
+
+        connection.executemany(
+            '''
+            INSERT INTO article_content (article_id, codec, data) VALUES (?, ?, ?)
+            ON CONFLICT (article_id) DO UPDATE
+            SET codec = excluded.codec,
+            data = excluded.data''',
+            ([article_id, *compress_content(article.content)] for article_id, article in written))
+
+        connection.executemany(
+            '''INSERT OR REPLACE INTO article_search (rowid, title, author, content) VALUES (?, ?, ?, ?)''',
+            ([article_id, article.title, article.author, plain_text(article.content)] for article_id, article in written))
+    return inserted, len(written) - inserted
+
+
+def match_query(text: str) -> str:
+    """Returns a full text search query which matches articles containing all the words in text, in any
+    order. The last word also matches longer words starting with it, since it may not be finished yet."""
+    words = ['"' + word.replace('"', '""') + '"' for word in text.split()]
+    if words:
+        words[-1] += "*"
+    return " ".join(words)
+
+
+def search_articles(connection: sqlite3.Connection, text: str, feed_ids: list[int] | None, limit: int, offset: int = 0) -> list[sqlite3.Row]:
+    """Returns the articles which match the words in text, best matches first, see match_query.
+
+    Only articles from feed_ids are searched, or all articles if it is None. Returns at most limit
+    articles, skipping the first offset matches."""
+    if text.strip() == "":
+        return []
+    ids = json.dumps(feed_ids) if feed_ids is not None else None
+    return connection.execute(
+        '''
+        SELECT feed_id, identifier, uri, articles.title, updated, articles.author, unread, flag
+        FROM article_search JOIN articles ON articles.id = article_search.rowid
+        WHERE article_search MATCH ? AND (? IS NULL OR feed_id IN (SELECT value FROM json_each(?)))
+        ORDER BY rank
+        LIMIT ? OFFSET ?''', [match_query(text), ids, ids, limit, offset]).fetchall()
+
+
+def get_article_content(connection: sqlite3.Connection, feed_id: int, identifier: str) -> str:
+    """Returns the content of an article, or an empty string if it has none."""
+    row = connection.execute(
+        '''
+        SELECT codec, data FROM article_content
+        WHERE article_id = (SELECT id FROM articles WHERE feed_id = ? AND identifier = ?)''', [feed_id, identifier]).fetchone()
+    return decompress_content(row[0], row[1]) if row is not None else ""
+
+
+def get_article_identifiers(db_file: str, feed_id: int) -> dict[str, datetime]:
+    """Returns a dict containing the updated time of all articles for a feed, by identifier.
+
+    Can be called from any thread or process."""
+    reader = get_reader(db_file)
+    with reader:
+        return read_article_identifiers(reader, feed_id)
+
+
+def read_article_identifiers(connection: sqlite3.Connection, feed_id: int) -> dict[str, datetime]:
+    """Returns a dict containing the updated time of all articles for a feed, by identifier, using connection."""
+    articles = {}
+    for article in connection.execute('''SELECT identifier, updated FROM articles WHERE feed_id = ?''', [feed_id]):
+        articles[article[0]] = datetime.fromtimestamp(article[1], timezone.utc)
+    return articles
+
+
+def delete_old_articles(connection: sqlite3.Connection, feed_id: int, before: float | None, keep: int | None, limit: int) -> int:
+    """Deletes at most limit of a feed's articles which were last updated before the timestamp before, or
+    which are not among its newest keep articles. Flagged articles are never deleted, and are not counted
+    in keep. before or keep can be None to not use them. Returns the number of articles deleted."""
+    deleted = 0
+    if before is not None:
+        deleted += connection.execute(
+            '''
+            DELETE FROM articles WHERE id IN (
+                SELECT id FROM articles WHERE feed_id = ? AND updated < ? AND flag = 0 LIMIT ?)''', [feed_id, before, limit]).rowcount
+    if keep is not None and deleted < limit:
+        deleted += connection.execute(
+            '''
+            DELETE FROM articles WHERE id IN (
+                SELECT id FROM articles WHERE feed_id = ? AND flag = 0
+                ORDER BY updated DESC, identifier DESC
+                LIMIT ? OFFSET ?)''', [feed_id, limit - deleted, keep]).rowcount
+    return deleted
+
+
+def get_deleted_feed_ids(connection: sqlite3.Connection) -> list[int]:
+    """Returns the ids of feeds which have articles, but which are not stored any more."""
+    return [row[0] for row in connection.execute(
+        '''SELECT feed_id FROM feed_stats WHERE total > 0 AND feed_id NOT IN (SELECT id FROM feeds)''')]
+
+
+def delete_feed_articles(connection: sqlite3.Connection, feed_id: int, limit: int) -> int:
+    """Deletes at most limit of a feed's articles, including flagged ones. Returns the number of articles deleted."""
+    return connection.execute(
+        '''DELETE FROM articles WHERE id IN (SELECT id FROM articles WHERE feed_id = ? LIMIT ?)''', [feed_id, limit]).rowcount
+
+
+def incremental_vacuum(connection: sqlite3.Connection, pages: int) -> int:
+    """Returns at most pages free pages of the database to the file system. Returns the number of free pages left."""
+    # the pragma frees one page each time it is stepped, so all its rows must be read
+    connection.execute(f'''PRAGMA incremental_vacuum({int(pages)})''').fetchall()
+    return connection.execute('''PRAGMA freelist_count''').fetchone()[0]
+
+
+def count_unread(connection: sqlite3.Connection, feed_id: int) -> int:
+    """Returns the number of unread articles for a feed."""
+    row = connection.execute('''SELECT unread FROM feed_stats WHERE feed_id = ?''', [feed_id]).fetchone()
+    return row[0] if row is not None else 0
+
+
+SORT_COLUMNS = ("title", "author", "updated")
+"Columns which a feed's articles can be sorted by."
+
+
+def get_articles_page(connection: sqlite3.Connection, feed_id: int, column: str, descending: bool, limit: int,
+                      after: tuple[Any, str] | None = None, offset: int = 0) -> list[sqlite3.Row]:
+    """Returns a page of a feed's articles, sorted by column and then identifier.
+
+    If after is passed, the page starts after the article with that column value and identifier, which
+    only reads the articles on the page. Otherwise the first offset articles are skipped.
+    """
+    if column not in SORT_COLUMNS:
+        raise ValueError(f"Cannot sort articles by {column}")
+    direction = "DESC" if descending else "ASC"
+    start = f"AND ({column}, identifier) {'<' if descending else '>'} (?, ?)" if after is not None else ""
+    return connection.execute(
+        f'''
+        SELECT feed_id, identifier, uri, title, updated, author, unread, flag FROM articles
+        WHERE feed_id = ? {start}
+        ORDER BY {column} {direction}, identifier {direction}
+        LIMIT ? OFFSET ?''',
+        [feed_id, *(after or ()), limit, offset]).fetchall()
+
+
+def get_article_positions(connection: sqlite3.Connection, feed_id: int, column: str, descending: bool, identifiers: set[str], limit: int) -> dict[str, int]:
+    """Returns the positions of the articles with identifiers among the first limit articles of a feed, when
+    sorted like get_articles_page. Articles which are further down are left out."""
+    if column not in SORT_COLUMNS:
+        raise ValueError(f"Cannot sort articles by {column}")
+    direction = "DESC" if descending else "ASC"
+    # only reads the feed's index on column, which also has the identifiers
+    rows = connection.execute(
+        f'''SELECT identifier FROM articles WHERE feed_id = ? ORDER BY {column} {direction}, identifier {direction} LIMIT ?''',
+        [feed_id, limit])
+    return {row[0]: i for i, row in enumerate(rows) if row[0] in identifiers}
+
+
+def count_articles(connection: sqlite3.Connection, feed_id: int) -> int:
+    """Returns the number of articles of a feed."""
+    row = connection.execute('''SELECT total FROM feed_stats WHERE feed_id = ?''', [feed_id]).fetchone()
+    return row[0] if row is not None else 0
+
+
+Statement = tuple[str, list[Any]]
+"A statement and its parameters, to be executed on the connection which writes."
+
+FEED_COLUMNS = ("title", "uri", "analyzer", "updated", "meta", "user_title", "refresh_rate", "ignore_new", "delete_time",
+                "max_articles", "failures", "retry_time", "last_error")
+"Columns of the feeds table which store the Feed attribute of the same name."
+
+
+def _feed_values(feed: Feed) -> list[Any]:
+    """Returns the values of the columns in FEED_COLUMNS for a feed."""
+    values = {column: getattr(feed, column) for column in FEED_COLUMNS}
+    values["updated"] = feed.updated.isoformat()
+    values["meta"] = json.dumps(feed.meta)
+    return list(values.values())
+
+
+def _next_position() -> str:
+    """Returns an expression for the position after the last child of a folder, which takes the folder's id twice."""
+    return '''(SELECT ifnull(max(position), -1) + 1 FROM (
+        SELECT position FROM feeds WHERE folder_id IS ? UNION ALL SELECT position FROM folders WHERE parent_id IS ?))'''
+
+
+def insert_feed_statement(feed: Feed) -> Statement:
+    """Returns a statement which adds a feed after the last child of its folder."""
+    folder_id = feed.parent_folder.db_id
+    return (f'''INSERT INTO feeds (id, folder_id, position, {", ".join(FEED_COLUMNS)})
+            VALUES (?, ?, {_next_position()}, {", ".join("?" * len(FEED_COLUMNS))})''',
+            [feed.db_id, folder_id, folder_id, folder_id, *_feed_values(feed)])
+
+
+def update_feed_statement(feed: Feed) -> Statement:
+    """Returns a statement which writes the attributes of a feed which is already stored."""
+    return (f'''UPDATE feeds SET {", ".join(column + " = ?" for column in FEED_COLUMNS)} WHERE id = ?''',
+            [*_feed_values(feed), feed.db_id])
+
+
+def delete_feed_statement(feed: Feed) -> Statement:
+    """Returns a statement which deletes a feed. Its articles are deleted later by retention."""
+    return ('''DELETE FROM feeds WHERE id = ?''', [feed.db_id])
+
+
+def insert_folder_statement(folder: Folder) -> Statement:
+    """Returns a statement which adds a folder after the last child of its parent folder."""
+    assert folder.parent_folder is not None, "the root folder is not stored"
+    parent_id = folder.parent_folder.db_id
+    return (f'''INSERT INTO folders (id, parent_id, position, title) VALUES (?, ?, {_next_position()}, ?)''',
+            [folder.db_id, parent_id, parent_id, parent_id, folder.title])
+
+
+def update_folder_statement(folder: Folder) -> Statement:
+    """Returns a statement which writes the title of a folder which is already stored."""
+    return ('''UPDATE folders SET title = ? WHERE id = ?''', [folder.title, folder.db_id])
+
+
+def delete_folder_statements(folder: Folder) -> list[Statement]:
+    """Returns statements which delete a folder, and all the feeds and folders in it."""
+    subtree = '''WITH RECURSIVE subtree (id) AS (
+        SELECT ? UNION ALL SELECT folders.id FROM folders JOIN subtree ON folders.parent_id = subtree.id)'''
+    return [(subtree + ''' DELETE FROM feeds WHERE folder_id IN subtree''', [folder.db_id]),
+            (subtree + ''' DELETE FROM folders WHERE id IN subtree''', [folder.db_id])]
+
+
+def get_next_feed_id(connection: sqlite3.Connection) -> int:
+    """Returns an id which is larger than the id of any stored feed, or of any deleted feed whose articles
+    have not all been deleted yet."""
+    return connection.execute(
+        '''SELECT ifnull(max(id), -1) + 1 FROM (SELECT id FROM feeds UNION ALL SELECT feed_id FROM feed_stats)''').fetchone()[0]
+
+
+def get_next_folder_id(connection: sqlite3.Connection) -> int:
+    """Returns an id which is larger than the id of any stored folder."""
+    return connection.execute('''SELECT ifnull(max(id), 0) + 1 FROM folders''').fetchone()[0]
+
+
+def read_feed_tree(connection: sqlite3.Connection) -> Folder:
+    """Returns the root folder, containing all the stored feeds and folders. The unread count of each feed
+    is read from feed_stats."""
+    root = Folder("root")
+    folders: dict[int | None, Folder] = {None: root}
+    children: list[tuple[int | None, int, Feed | Folder]] = []
+
+    for row in connection.execute('''SELECT id, parent_id, position, title FROM folders'''):
+        folder = Folder(row['title'])
+        folder.db_id = row['id']
+        folders[folder.db_id] = folder
+        children.append((row['parent_id'], row['position'], folder))
+
+    for row in connection.execute(
+            f'''
+            SELECT id, folder_id, position, {", ".join("feeds." + column for column in FEED_COLUMNS)}, ifnull(feed_stats.unread, 0) AS unread_count
+            FROM feeds LEFT JOIN feed_stats ON feed_stats.feed_id = feeds.id'''):
+        values = {column: row[column] for column in FEED_COLUMNS}
+        values["updated"] = datetime.fromisoformat(row['updated'])
+        values["meta"] = json.loads(row['meta'])
+        values["ignore_new"] = bool(row['ignore_new'])
+        values["db_id"] = row['id']
+        values["unread_count"] = row['unread_count']
+        feed = Feed(root)
+        # the values were checked before they were written, so they are not checked again
+        feed.update(values, validate=False)
+        children.append((row['folder_id'], row['position'], feed))
+
+    children.sort(key=lambda child: child[1])
+    for parent_id, _, node in children:
+        parent = folders.get(parent_id)
+        if parent is None:
+            # the folder was deleted, which also deletes what is in it
+            continue
+        node.parent_folder = parent
+        parent.children.append(node)
+    return root
+
+
+def get_feed_stats(connection: sqlite3.Connection) -> dict[int, sqlite3.Row]:
+    """Returns the total, unread and flagged article counts of every feed, by feed id."""
+    return {row['feed_id']: row for row in connection.execute('''SELECT feed_id, total, unread, flagged FROM feed_stats''')}
+
+
+def get_publish_intervals(db_file: str, feed_id: int | None = None, samples: int = 20) -> dict[int, float]:
+    """Returns the average number of seconds between new articles for each feed, by feed id.
+
+    The estimate is the time from the oldest of a feed's last samples articles until now, divided by the
+    number of those articles, so that it grows while a feed is quiet. Feeds with fewer than two articles
+    are left out. If feed_id is passed, only that feed is returned.
+    """
+    reader = get_reader(db_file)
+    with reader:
+        if feed_id is not None:
+            feed_ids = [feed_id]
+        else:
+            feed_ids = [row[0] for row in reader.execute('''SELECT feed_id FROM feed_stats WHERE total >= 2''')]
+
+        intervals: dict[int, float] = {}
+        now = time.time()
+        for feed_id in feed_ids:
+            # only reads the feed's last samples entries of the articles_feed_updated index, which is much
+            # faster than ranking every article with a window function
+            row = reader.execute('''
+                SELECT (? - min(updated)) / count(*) AS interval, count(*) AS count FROM (
+                    SELECT updated FROM articles WHERE feed_id = ? ORDER BY updated DESC LIMIT ?)''',
+                [now, feed_id, samples]).fetchone()
+            if row['count'] >= 2:
+                intervals[feed_id] = row['interval']
+        return intervals
@@ -1,18 +1,29 @@
 from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
 import importlib.util
+import multiprocessing
+import os
 from pathlib import Path
+import sys
 
 from typing import Any, Callable, Iterator
 
+from requests import Response
+
 from util import check_type, check_val
+from settings import settings
+from analyzers.util import FetchContext, Session
 
 class Feed():
     """Holds information for a feed, and its metadata."""
 
-    def __init__(self, parent_folder: Folder, data: FeedData | None = None):
-        """Initialize a feed with all of its required elements."""
+    def __init__(self, parent_folder: Folder, data: FeedData | None = None, validate: bool = True):
+        """Initialize a feed with all of its required elements.
+
+        If validate is False, the types of data are not checked. Only pass it for data which has already been
+        checked, such as data read back from the database."""
         
         # feed data
         self.title: str = "untitled feed"
@@ -49,26 +60,39 @@ class Feed():
         self.delete_time: int | None = None
         "Custom delete policy for this feed."
 
+        self.max_articles: int | None = None
+        "Custom number of articles to keep for this feed, not counting flagged articles."
+
         self.unread_count: int = 0
         "The number of unread articles."
 
+        # fetch status
+        self.failures: int = 0
+        "The number of times in a row fetching the feed has failed."
+
+        self.retry_time: float = 0
+        "The feed is not refreshed on schedule before this time, after fetching it has failed."
+
+        self.last_error: str | None = None
+        "The error from the last failed fetch of the feed."
+
         if data:
-            self.update(data)
-            self.type_check()
+            self.update(data, validate)
 
 
     def __iter__(self):
         yield self
 
 
-    def update(self, data: FeedData | dict[str, Any]):
-        """Update the feed with new values."""
+    def update(self, data: FeedData | dict[str, Any], validate: bool = True):
+        """Update the feed with new values, and check their types unless validate is False."""
 
         if type(data) is dict:
             vars(self).update(data)
         else:
             vars(self).update(vars(data))
-        self.type_check()
+        if validate:
+            self.type_check()
 
 
     def type_check(self):
@@ -88,8 +112,14 @@ class Feed():
         check_type(int | None, self.refresh_rate)
         check_type(bool, self.ignore_new)
         check_type(int | None, self.delete_time)
+        check_type(int | None, self.max_articles)
         check_type(int, self.unread_count)
 
+        # fetch status
+        check_type(int, self.failures)
+        check_type(float | int, self.retry_time)
+        check_type(str | None, self.last_error)
+
         check_val(self.db_id, -1)
         check_val(self.analyzer, "undefined")
         check_val(self.uri, "undefined")
@@ -102,9 +132,17 @@ class FeedData(Feed):
 
 
 class Article():
-    """Holds information from an entry/article in an Atom RSS feed."""
+    """Holds information from an entry/article in an Atom RSS feed.
+
+    Articles have __slots__ rather than a __dict__, so that many of them can be held in little memory.
+    meta is only allocated when it is used.
+    """
 
-    def __init__(self, data: ArticleData | None = None):
+    __slots__ = ("identifier", "title", "updated", "content", "author", "uri", "_meta", "feed_id", "unread", "flag")
+
+    def __init__(self, data: ArticleData | None = None, validate: bool = True):
+        """If validate is False, the types of data are not checked. Only pass it for data which has already
+        been checked, such as data read back from the database."""
 
         self.identifier: str = "article id"
         self.title: str = "untitled article"
@@ -112,7 +150,7 @@ class Article():
         self.content: str = "no content"
         self.author: str = "no author"
         self.uri: str | None = None
-        self.meta: dict[str, Any] = {}
+        self._meta: dict[str, Any] | None = None
 
         # attributes used by feed_manager
         self.feed_id: int = -1
@@ -120,16 +158,54 @@ class Article():
         self.flag: bool = False
 
         if data:
-            self.update(data)
+            self.update(data, validate)
+
 
+    @classmethod
+    def stored(cls, feed_id: int, identifier: str, uri: str | None, title: str, updated: datetime, author: str, unread: bool, flag: bool) -> Article:
+        """Creates an article from values read back from the database, without checking their types.
 
-    def update(self, data: ArticleData | dict[str, Any]):
-        """Update the feed with new values."""
+        The content is not stored with the other values, so it is left empty. Authors are interned, since
+        most articles of a feed share one."""
+        article = cls.__new__(cls)
+        article.feed_id = feed_id
+        article.identifier = identifier
+        article.uri = uri
+        article.title = title
+        article.updated = updated
+        article.author = sys.intern(author) if type(author) is str else author
+        article.content = ""
+        article._meta = None
+        article.unread = unread
+        article.flag = flag
+        return article
+
+
+    @property
+    def meta(self) -> dict[str, Any]:
+        """Any metadata the article uses."""
+        if self._meta is None:
+            self._meta = {}
+        return self._meta
+
+
+    @meta.setter
+    def meta(self, value: dict[str, Any]):
+        self._meta = value
+
+
+    def update(self, data: ArticleData | dict[str, Any], validate: bool = True):
+        """Update the article with new values, and check their types unless validate is False."""
         if type(data) is dict:
-            vars(self).update(data)
+            for name, value in data.items():
+                setattr(self, name, value)
         else:
-            vars(self).update(vars(data))
-        self.type_check()
+            # only the values which were set on data
+            for name in self.__slots__:
+                if hasattr(data, name):
+                    setattr(self, name, getattr(data, name))
+        if validate:
+            self.type_check()
 
 
     def type_check(self):
@@ -139,7 +215,8 @@ class Article():
         check_type(str, self.content)
         check_type(str, self.author)
         check_type(str | None, self.uri)
-        check_type(dict[str, Any], self.meta)
+        if self._meta is not None:
+            check_type(dict[str, Any], self._meta)
 
         # attributes used by feed_manager
         check_type(int, self.feed_id)
@@ -153,7 +230,7 @@ class Article():
 
 
 class ArticleData(Article):
-    """Class for storing Feed attributes in a dictionary."""
+    """Class for storing Article attributes, only the ones which are set are used by Article.update."""
     def __init__(self):
         pass
 
@@ -171,19 +248,24 @@ class Folder:
         self.parent_folder = parent_folder
         self.children: list[Feed | Folder] = [] if children is None else children
 
+        self.db_id: int | None = None
+        "The folder id to use in the database. The root folder is not stored, and has None."
+
 
-    def update(self, data: FolderData | dict[str, Any]):
-        """Update the feed with new values."""
+    def update(self, data: FolderData | dict[str, Any], validate: bool = True):
+        """Update the folder with new values, and check their types unless validate is False."""
         if type(data) is dict:
             vars(self).update(data)
         else:
             vars(self).update(vars(data))
-        self.type_check()
+        if validate:
+            self.type_check()
 
 
     def type_check(self):
         check_type(str, self.title)
         check_type(Folder | None, self.parent_folder)
+        check_type(int | None, self.db_id)
         check_type(list[Feed | Folder], self.children)
 
 
@@ -199,10 +281,12 @@ class FolderData(Folder):
         pass
 
 
-analyzer = Callable[[str], tuple[FeedData, list[ArticleData]]]
+analyzer = Callable[[str, FetchContext], tuple[FeedData, list[ArticleData]] | None]
 action = Callable[[Article], Any]
 analyzers: dict[str, analyzer] = {}
 actions: dict[str, action] = {}
+session = Session(pool_size=settings.max_host_fetches)
+"Connection pool shared by all the analyzers."
 
 
 for analyzer_file in Path("analyzers").glob("analyzer-*"):
@@ -215,9 +299,33 @@ for analyzer_file in Path("analyzers").glob("analyzer-*"):
     actions.update(check_type(dict[str, action], module.actions))
 
 
-def get_feed(uri: str, analyzer: str) -> tuple[FeedData, list[ArticleData]]:
-    """Retrives and processes data for a feed from the internet."""
-    return analyzers[analyzer](uri)
+def get_feed(uri: str,
+             analyzer: str,
+             meta: dict[str, Any] | None = None,
+             prefetched: dict[str, Response] | None = None,
+             known_articles: Callable[[], dict[str, datetime]] | None = None) -> tuple[FeedData, list[ArticleData]] | None:
+    """Retrives and processes data for a feed from the internet.
+
+    meta should be the meta of the feed from its previous fetch, if there was one. It is used to make a
+    conditional request, and None is returned if the feed has not changed since then.
+    prefetched holds responses that were already downloaded, by uri, which the analyzer uses instead of
+    downloading them again.
+    known_articles returns the articles of the feed that are already stored, which analyzers may skip.
+    """
+    return analyzers[analyzer](uri, FetchContext(session, meta, prefetched, known_articles))
+
+
+def create_parse_pool() -> ProcessPoolExecutor | None:
+    """Creates the pool of processes the fetch engines run analyzers in.
+
+    Returns None if settings.parse_processes is 0, in which case analyzers are run in the fetch threads.
+    A negative value uses a process for each core.
+    """
+    if settings.parse_processes == 0:
+        return None
+    processes = settings.parse_processes if settings.parse_processes > 0 else os.cpu_count()
+    # new processes are spawned rather than forked, since forking a process that is running Qt is unsafe
+    return ProcessPoolExecutor(processes, multiprocessing.get_context("spawn"))
 
 
 def apply_action(feed: Feed, article: Article):
@@ -1,120 +1,152 @@
-from copy import copy
 import sqlite3
 import json
-from datetime import datetime, timedelta, timezone
-from typing import Any, List, Dict
-import os
+from datetime import datetime, timezone
+from typing import Any, List
 import logging
+from functools import partial
 
 from PySide6 import QtCore as qtc
 
 from feed import ArticleData, Feed, Article, FeedData, Folder, get_feed
 from feed_updater import UpdateThread
+from ingest import IngestThread
+from async_updater import AsyncUpdater
 from settings import settings
+import database
 
 
 class FeedManager(qtc.QObject):
     """Manages the feed data and provides an interface for getting that data."""
 
-    new_article_event: qtc.Signal = qtc.Signal(Article)
+    new_articles_event: qtc.Signal = qtc.Signal(list)
+    "Fires once for each feed written to the database which has new articles, with the new articles."
     article_updated_event: qtc.Signal = qtc.Signal(Article)
     feeds_updated_event: qtc.Signal = qtc.Signal()
+    articles_marked_event: qtc.Signal = qtc.Signal(list, object, bool)
+    "Fires when the unread status of many articles is set, with their feed ids, the time they are older than or None, and the status."
+    search_index_event: qtc.Signal = qtc.Signal(int, int)
+    "Fires while stored articles are added to the search index, with the number left and the number there were."
 
-    def __init__(self):
-        super().__init__()
-
-        def traverse_dict_output_folder(node: dict[str, Any], parent: Folder):
-            # its a folder
-            if "children" in node:
-                folder = Folder(node["title"], parent)
-                for child in node["children"]:
-                    folder.children.append(traverse_dict_output_folder(child, folder))
-                return folder
-            # its a feed
-            else:
-                feed = Feed(parent)
-
-                if node["updated"] == None:
-                    node["updated"] = datetime.fromtimestamp(0)
-                else:
-                    node["updated"] = datetime.fromisoformat(node["updated"])
-
-                feed.update(node)
-                return feed
-
-        if not os.path.exists("data/feeds.json"):
-            with open("data/feeds.json", "w") as _new_file:
-                _new_file.write("[]")
+    unread_write_delay = 500
+    "Milliseconds single articles marked read or unread are held for, so that they are written together."
 
-        with open("data/feeds.json", "rb") as _feeds_file:
-            contents = _feeds_file.read().decode("utf-8")
-        
-        self.feed_cache = Folder("root")
-        """feed_cache is a folder, and the 'root' folder for the feed manager.
-        Currently done like this for easier setting of parents, adding to folder, and refresh."""
+    # pass data from the asyncio fetch engine's thread to the feed manager's thread
+    _data_downloaded_event: qtc.Signal = qtc.Signal(Feed, Feed, list)
+    _fetch_status_event: qtc.Signal = qtc.Signal(Feed)
 
-        feed_dict: list[dict[str, Any]] = json.loads(contents)
-        for item in feed_dict:
-            self.feed_cache.children.append(traverse_dict_output_folder(item, self.feed_cache))
-
-
-        self._sqlite_connection = sqlite3.connect(settings.db_file)
-        self._sqlite_connection.row_factory = sqlite3.Row
-
-        # create and start scheduler thread
-        self._update_thread = UpdateThread(self.feed_cache, settings)
+    def __init__(self):
+        super().__init__()
 
         self._initialize_database()
 
-        self._update_thread.data_downloaded_event.connect(self._handle_data_downloaded)
+        # the feed manager only reads the database, everything is written by the ingest thread
+        self._readers = database.ReaderPool(settings.db_file, settings.db_readers, settings.db_shared_cache)
+
+        with self._readers.connection() as reader:
+            self.feed_cache = database.read_feed_tree(reader)
+            """feed_cache is a folder, and the 'root' folder for the feed manager.
+            Currently done like this for easier setting of parents, adding to folder, and refresh."""
+            self._feed_counter = database.get_next_feed_id(reader)
+            self._folder_counter = database.get_next_folder_id(reader)
+
+        # unread statuses of single articles which have not been written yet, by feed id and identifier
+        self._unread_writes: dict[tuple[int, str], bool] = {}
+        self._unread_write_timer = qtc.QTimer(self)
+        self._unread_write_timer.setSingleShot(True)
+        self._unread_write_timer.setInterval(self.unread_write_delay)
+        self._unread_write_timer.timeout.connect(self._write_unread_statuses)
+
+        self._ingest_thread = IngestThread(settings)
+        self._ingest_thread.set_retained_feeds(self.feed_cache)
+        self._ingest_thread.feed_ingested_event.connect(self._handle_feed_ingested)
+        self._ingest_thread.unread_counts_event.connect(self._handle_unread_counts)
+        self._ingest_thread.search_index_event.connect(self.search_index_event)
+        self._ingest_thread.start()
+
+        # create and start the fetch engine
+        self._update_thread = self._create_updater()
         self._update_thread.start()
 
         if settings.startup_update is True:
-            self.refresh_all()
+            self._update_thread.spread_refresh_folder(self.feed_cache, settings.startup_refresh_window)
 
 
     def cleanup(self) -> None:
         """Closes db connection and exits threads gracefully."""
 
-        self._update_thread.requestInterruption()
-        self._update_thread.schedule_update_event.set()
-        if self._update_thread.wait(1) is False:
-            logging.info("not enough time to stop thread 0.5")
-        self._save_feeds()
-        self._sqlite_connection.close()
+        self._update_thread.stop()
+        self._write_unread_statuses()
+        self._ingest_thread.stop()
+        self._readers.close()
 
 
-    def get_articles(self, feed_id: int) -> List[Article]:
-        """Returns a list containing all the articles with feed_id.
+    def get_articles_page(self, feed_id: int, column: str, descending: bool, limit: int, after: Article | None = None, offset: int = 0) -> List[Article]:
+        """Returns a page of the articles with feed_id, sorted by column and then by identifier.
 
         Args:
             feed_id: The id of the feed to return articles from.
+            column: The attribute of the articles to sort by, one of title, author, or updated.
+            descending: Whether to sort in descending order.
+            limit: The largest number of articles to return.
+            after: The article the page starts after. This is much faster than using offset.
+            offset: The number of articles to skip, if after is not passed.
 
         Returns:
             A list of articles with the corresponding feed_id.
         """
-        articles = []
-        for row in self._sqlite_connection.execute('SELECT identifier, uri, title, updated, author, content, unread, flag FROM articles WHERE feed_id = ? ORDER BY updated DESC LIMIT 200', [feed_id]):
-            data = ArticleData()
-            data.feed_id = feed_id
-            data.identifier = row['identifier']
-            data.uri = row['uri']
-            data.title = row['title']
-            data.updated = datetime.fromtimestamp(row['updated'], timezone.utc)
-            data.author = row['author']
-            data.content = row['content']
-            data.unread = bool(row['unread'])
-            data.flag = bool(row['flag'])
-            articles.append(Article(data))
-        return articles
+        with self._readers.connection() as reader:
+            rows = database.get_articles_page(reader, feed_id, column, descending, limit, self._sort_key(after, column) if after is not None else None, offset)
+        return [self._article_from_row(row) for row in rows]
+
+
+    def count_articles(self, feed_id: int) -> int:
+        """Returns the number of articles with feed_id."""
+        with self._readers.connection() as reader:
+            return database.count_articles(reader, feed_id)
+
+
+    def get_article_positions(self, feed_id: int, column: str, descending: bool, identifiers: set[str], limit: int) -> dict[str, int]:
+        """Returns the positions of articles of a feed by identifier, among the first limit articles sorted like
+        get_articles_page. Articles which are further down are left out."""
+        with self._readers.connection() as reader:
+            return database.get_article_positions(reader, feed_id, column, descending, identifiers, limit)
+
+
+    def search(self, text: str, scope: Feed | Folder | None = None, limit: int = 200, offset: int = 0) -> List[Article]:
+        """Returns the articles containing words which start with each of the words in text, best matches first.
+
+        Args:
+            text: The words to search for.
+            scope: The feed or folder to search the articles of, or None to search all feeds.
+            limit: The largest number of articles to return.
+            offset: The number of best matches to skip, to get later pages of results.
+        """
+        feed_ids = [feed.db_id for feed in scope] if scope is not None else None
+        with self._readers.connection() as reader:
+            rows = database.search_articles(reader, text, feed_ids, limit, offset)
+        return [self._article_from_row(row) for row in rows]
+
+
+    def find_feed(self, feed_id: int) -> Feed | None:
+        """Returns the feed with the db_id, or None if there is none."""
+        return next((feed for feed in self.feed_cache if feed.db_id == feed_id), None)
+
+
+    def get_article_content(self, article: Article) -> str:
+        """Returns the content of an article, which is not loaded by get_articles."""
+        with self._readers.connection() as reader:
+            return database.get_article_content(reader, article.feed_id, article.identifier)
 
 
     def add_feed(self, location: str, folder: Folder, analyzer: str) -> None:
         """Adds a feed to the folder."""
 
-        feeddata, articledata = get_feed(location, analyzer)
+        result = get_feed(location, analyzer)
+        assert result is not None, "Unconditional fetch of a feed returned no data!"
+        feeddata, articledata = result
 
-        feeddata.db_id = settings.feed_counter
+        feeddata.db_id = self._feed_counter
+        self._feed_counter += 1
         feeddata.uri = location
         feeddata.analyzer = analyzer
         feed = Feed(folder, feeddata)
@@ -122,23 +154,23 @@ class FeedManager(qtc.QObject):
         folder.children.append(feed)
         self.feeds_updated_event.emit()
 
-        self._add_articles_to_db(feed, articledata)
-
-        settings.feed_counter += 1
-        self._save_feeds()
+        self._ingest_thread.execute(*database.insert_feed_statement(feed))
+        self._ingest_thread.add(feed, None, articledata)
+        self._ingest_thread.set_retained_feeds(self.feed_cache)
 
 
     def update_feed(self, feed: Feed, data: FeedData) -> None:
         """Sets properties for all feeds.
 
         Will check if value is same as previous value, and will not update if that is the case.
-        Saves feed changes to disk."""
+        Writes the feed to the database."""
         old_refresh_rate = feed.refresh_rate
 
         feed.update(data)
         if old_refresh_rate != data.refresh_rate:
             self._update_thread.update_refresh_rate(feed, data.refresh_rate)
-        self._save_feeds()
+        self._ingest_thread.execute(*database.update_feed_statement(feed))
+        self._ingest_thread.set_retained_feeds(self.feed_cache)
         self.feeds_updated_event.emit()
 
 
@@ -147,43 +179,40 @@ class FeedManager(qtc.QObject):
 
         Removes a feed with passed feed_id, and its entry from the refresh schedule.
         """
-        if feed.refresh_rate is not None:
-            self._update_thread.remove_feed(feed)
+        self._update_thread.remove_feed(feed)
 
         assert feed.parent_folder.children.index(feed) != -1, "Folder was not found when trying to delete it!"
         del feed.parent_folder.children[feed.parent_folder.children.index(feed)]
-        self._save_feeds()
+        self._ingest_thread.execute(*database.delete_feed_statement(feed))
+        self._ingest_thread.set_retained_feeds(self.feed_cache)
 
 
     def add_folder(self, folder_name: str, folder: Folder) -> None:
         """Adds a folder."""
         new_folder = Folder(folder_name, folder)
+        new_folder.db_id = self._folder_counter
+        self._folder_counter += 1
         folder.children.append(new_folder)
-        self._save_feeds()
+        self._ingest_thread.execute(*database.insert_folder_statement(new_folder))
 
 
     def delete_folder(self, folder: Folder) -> None:
-        """Deletes a folder."""
-
-        def delete_feeds_in_folder(folder: Folder) -> None:
-            """Deletes all feeds in a folder recursively."""
-            for child in folder.children:
-                if type(child) is Feed:
-                    self.delete_feed(child)
-                elif type(child) is Folder: # TODO: check if narrowing works now
-                    delete_feeds_in_folder(child)
+        """Deletes a folder, and all the feeds and folders in it."""
+        for feed in folder:
+            self._update_thread.remove_feed(feed)
 
-        delete_feeds_in_folder(folder)
         if folder.parent_folder:
             folder.parent_folder.children.remove(folder)
 
-        self._save_feeds()
+        for statement in database.delete_folder_statements(folder):
+            self._ingest_thread.execute(*statement)
+        self._ingest_thread.set_retained_feeds(self.feed_cache)
 
 
     def rename_folder(self, name: str, folder: Folder) -> None:
         """Changes the name of a folder."""
         folder.title = name
-        self._save_feeds()
+        self._ingest_thread.execute(*database.update_folder_statement(folder))
 
 
     def refresh_all(self) -> None:
@@ -199,22 +228,69 @@ class FeedManager(qtc.QObject):
     def set_article_unread_status(self, feed: Feed, article: Article, status: bool) -> None:
         """Sets the unread status in the article, and in the database.
 
-        Also updates the feed's unread_count, and emits an event for this.
+        Also updates the feed's unread_count. The write is held for a short time, so that articles marked
+        one after another, such as while moving through them with the keyboard, are written together.
         Does not do anything if the status is not different.
         """
         if article.unread != status:
             article.unread = status
-            with self._sqlite_connection:
-                self._sqlite_connection.execute('''UPDATE articles SET unread = ? WHERE identifier = ? and feed_id = ?''', [status, article.identifier, article.feed_id])
-            feed.unread_count = self._get_unread_articles_count(feed)
+            key = (article.feed_id, article.identifier)
+            if key in self._unread_writes:
+                # marked back before it was written, so the database already has this status
+                del self._unread_writes[key]
+            else:
+                self._unread_writes[key] = status
+            # the write has only been queued, so the count is changed here rather than read back
+            feed.unread_count += 1 if status else -1
+            if not self._unread_write_timer.isActive():
+                self._unread_write_timer.start()
+
+
+    def set_articles_unread_status(self, articles: List[Article], status: bool) -> None:
+        """Sets the unread status of a selection of articles, which may be from different feeds, with one statement."""
+        changed = [article for article in articles if article.unread != status]
+        if not changed:
+            return
+        feeds = {feed.db_id: feed for feed in self.feed_cache}
+        for article in changed:
+            article.unread = status
+            self._unread_writes.pop((article.feed_id, article.identifier), None)
+            feed = feeds.get(article.feed_id)
+            if feed is not None:
+                feed.unread_count += 1 if status else -1
+        self._ingest_thread.execute(*self._unread_status_statement([(article.feed_id, article.identifier) for article in changed], status))
+        self.feeds_updated_event.emit()
+
+
+    def mark_read(self, scope: Feed | Folder, before: datetime | None = None, status: bool = False) -> None:
+        """Marks all articles of a feed, or of all feeds in a folder, as read with one statement.
+
+        Args:
+            scope: The feed or folder whose articles are marked.
+            before: If passed, only articles last updated before this time are marked.
+            status: The unread status to set, so True marks the articles unread instead.
+        """
+        feed_ids = [feed.db_id for feed in scope]
+        cutoff = before.timestamp() if before is not None else None
+        # single articles marked before this must not be written after it
+        self._write_unread_statuses()
+        self._ingest_thread.execute(
+            '''UPDATE articles SET unread = ?
+            WHERE feed_id IN (SELECT value FROM json_each(?)) AND unread = ? AND (? IS NULL OR updated < ?)''',
+            [status, json.dumps(feed_ids), not status, cutoff, cutoff])
+
+        if before is None and status is False:
+            # otherwise the counts are not known until the statement has run, see _handle_unread_counts
+            for feed in scope:
+                feed.unread_count = 0
             self.feeds_updated_event.emit()
+        self.articles_marked_event.emit(feed_ids, before, status)
 
 
     def toggle_article_flag(self, article: Article) -> None:
         """Inverts flag status on an article."""
         article.flag = not article.flag
-        with self._sqlite_connection:
-            self._sqlite_connection.execute('''UPDATE articles SET flag = ? WHERE identifier = ? and feed_id = ?''', [article.flag, article.identifier, article.feed_id])
+        self._ingest_thread.execute('''UPDATE articles SET flag = ? WHERE identifier = ? and feed_id = ?''', [article.flag, article.identifier, article.feed_id])
 
 
     def set_default_refresh_rate(self, rate: int) -> None:
@@ -222,127 +298,104 @@ class FeedManager(qtc.QObject):
         self._update_thread.update_global_refresh_rate(rate)
 
 
+    def _create_updater(self) -> UpdateThread | AsyncUpdater:
+        """Creates the fetch engine chosen in the settings, and connects it to the feed manager."""
+        known_articles = partial(database.get_article_identifiers, settings.db_file)
+
+        if settings.fetch_engine == "asyncio":
+            try:
+                updater = AsyncUpdater(self.feed_cache, settings, self._data_downloaded_event.emit, self._fetch_status_event.emit, known_articles)
+                self._data_downloaded_event.connect(self._handle_data_downloaded)
+                self._fetch_status_event.connect(self._handle_fetch_status)
+                return updater
+            except ImportError:
+                logging.exception("Cannot use the asyncio fetch engine, using the thread engine instead.")
+
+        updater = UpdateThread(self.feed_cache, settings, known_articles)
+        updater.data_downloaded_event.connect(self._handle_data_downloaded)
+        updater.fetch_status_event.connect(self._handle_fetch_status)
+        return updater
+
+
     def _initialize_database(self) -> None:
-        """Creates all the tables used."""
-        with self._sqlite_connection:
-            self._sqlite_connection.execute('''CREATE TABLE IF NOT EXISTS articles (
-                feed_id INTEGER,
-                identifier TEXT,
-                uri TEXT,
-                title TEXT,
-                updated FLOAT,
-                author TEXT,
-                content TEXT,
-                unread BOOLEAN,
-                flag BOOLEAN)''')
-
-
-    def _save_feeds(self):
-        """Saves the feeds to disk."""
-
-        def default(o: Feed | Folder):
-            if type(o) is Feed:
-                feed = copy(o)
-                data = vars(feed)
-                data["updated"] = feed.updated.isoformat()
-                data.pop("parent_folder")
-                return data
-            elif type(o) is Folder:
-                folder = copy(o)
-                data = vars(folder)
-                data.pop("parent_folder")
-                return data
-
-        content = json.dumps(self.feed_cache.children, default=default, indent=4)
-        with open("data/feeds.json", "w") as feeds_file:
-            feeds_file.write(content)
-
-
-    def _get_unread_articles_count(self, feed: Feed) -> int:
-        """Return the number of unread articles for a feed."""
-        with self._sqlite_connection:
-            return self._sqlite_connection.execute('''SELECT count(*) FROM articles WHERE unread = 1 AND feed_id = ?''', [feed.db_id]).fetchone()[0]
-
-
-    def _get_article_identifiers(self, feed_id: int) -> Dict[str, datetime]:
-        """Returns a dict containing all the identifiers of all articles for a feed."""
-        articles = {}
-        with self._sqlite_connection:
-            for article in self._sqlite_connection.execute('''SELECT identifier, updated FROM articles WHERE feed_id = ?''', [feed_id]):
-                articles[article['identifier']] = datetime.fromtimestamp(article['updated'], timezone.utc)
-        return articles
+        """Creates all the tables used, or upgrades them from an older version."""
+        connection = database.connect(settings.db_file)
+        try:
+            database.migrate(connection)
+        finally:
+            connection.close()
+
+
+    def _sort_key(self, article: Article, column: str) -> tuple[Any, str]:
+        """Returns the values an article is sorted by in the database, when sorting by column."""
+        value = getattr(article, column)
+        return (value.timestamp() if column == "updated" else value, article.identifier)
+
+
+    def _article_from_row(self, row: sqlite3.Row) -> Article:
+        """Creates an article from a row of the articles table. The content of the article is not loaded."""
+        return Article.stored(
+            row['feed_id'],
+            row['identifier'],
+            row['uri'],
+            row['title'],
+            datetime.fromtimestamp(row['updated'], timezone.utc),
+            row['author'],
+            # the status of an article marked read or unread may not have been written yet
+            self._unread_writes.get((row['feed_id'], row['identifier']), bool(row['unread'])),
+            bool(row['flag']))
 
 
     def _handle_data_downloaded(self, feed: Feed, new_feed_data: FeedData, articles: List[ArticleData]):
-        """Recieves updated or new feed data."""
-        feed.update(new_feed_data)
+        """Recieves updated or new feed data, and passes it on to be written to the database."""
+        self._ingest_thread.add(feed, new_feed_data, articles)
+
+
+    def _handle_feed_ingested(self, feed: Feed, new_feed_data: FeedData | None, new_articles: list[Article], updated_articles: list[Article], unread_count: int):
+        """Recieves a feed whose articles have been written to the database."""
+        if new_feed_data is not None:
+            feed.update(new_feed_data)
+            self._ingest_thread.execute(*database.update_feed_statement(feed))
+        feed.unread_count = unread_count + self._pending_unread_change(feed.db_id)
+
+        if new_articles:
+            self.new_articles_event.emit(new_articles)
+        for article in updated_articles:
+            self.article_updated_event.emit(article)
+        self.feeds_updated_event.emit()
+
 
-        self._add_articles_to_db(feed, articles)
+    def _handle_unread_counts(self, counts: dict[int, int]):
+        """Recieves the unread counts of all feeds, after articles were marked read or unread in the database."""
+        for feed in self.feed_cache:
+            feed.unread_count = counts.get(feed.db_id, 0) + self._pending_unread_change(feed.db_id)
         self.feeds_updated_event.emit()
 
 
-    def _update_articles(self, articles: list[Article]):
-        """Updates multiple existing articles in the database."""
-        with self._sqlite_connection:
-            for article in articles:
-                self._sqlite_connection.execute(
-                    '''
-                    UPDATE articles
-                    SET uri = ?,
-                    title = ?,
-                    updated = ?,
-                    author = ?,
-                    content = ?,
-                    unread = ?
-                    WHERE identifier = ?''',
-                    [article.uri, article.title, article.updated.timestamp(), article.author, article.content, article.unread,
-                     article.identifier])
-
-
-    def _add_articles_to_db(self, feed: Feed, articles: list[ArticleData]):
-        """Processes newly created articles for the feed, and adds them to the database.
-
-        Checks for and delete old articles in the list, and delete old aricles in the database.
-        If the article already exists in the database, will update it instead of adding.
-        Will also update the unread count on the feed."""
-
-        delete_time = feed.delete_time if feed.delete_time is not None else settings.default_delete_time
-
-        if delete_time == 0:
-            date_cutoff = None
-        else:
-            date_cutoff = datetime.now(timezone.utc) - timedelta(minutes=delete_time)
-            # Deletes articles in the database which are not after the passed time_limit.
-            with self._sqlite_connection:
-                self._sqlite_connection.execute('''DELETE from articles WHERE updated < ? and feed_id = ?''', [date_cutoff.timestamp(), feed.db_id])
-
-        known_ids = self._get_article_identifiers(feed.db_id)
-
-        new_articles = []
-        updated_articles = []
-        for articledata in articles:
-            articledata.feed_id = feed.db_id
-            article = Article(articledata)
-
-            if date_cutoff is not None and article.updated < date_cutoff:
-                continue
-
-            if article.identifier in known_ids:
-                if known_ids[article.identifier] > article.updated:
-                    updated_articles.append(article)
+    def _pending_unread_change(self, feed_id: int) -> int:
+        """Returns how much the marks of a feed's articles which are not written yet change its unread count.
+        They are counted already in the GUI, so they are added to counts read from the database."""
+        return sum(1 if status else -1 for (key_feed_id, _), status in self._unread_writes.items() if key_feed_id == feed_id)
 
-            else:
-                self.new_article_event.emit(article)
-                new_articles.append(article)
 
-        self._update_articles(updated_articles)
-        map(self.article_updated_event.emit, updated_articles)
+    def _write_unread_statuses(self) -> None:
+        """Queues the writes of single articles marked read or unread, with one statement for each status."""
+        self._unread_write_timer.stop()
+        for status in (False, True):
+            keys = [key for key, value in self._unread_writes.items() if value is status]
+            if keys:
+                self._ingest_thread.execute(*self._unread_status_statement(keys, status))
+        self._unread_writes.clear()
 
-        # add the articles to the database.
-        with self._sqlite_connection:
-            for article in new_articles:
-                self._sqlite_connection.execute(
-                    '''INSERT INTO articles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                    [feed.db_id, article.identifier, article.uri, article.title, article.updated.timestamp(), article.author, article.content, True, False])
 
-        feed.unread_count = self._get_unread_articles_count(feed)
+    def _unread_status_statement(self, keys: List[tuple[int, str]], status: bool) -> tuple[str, list[Any]]:
+        """Returns a statement which sets the unread status of the articles with the feed ids and identifiers."""
+        return ('''UPDATE articles SET unread = ?
+            WHERE (feed_id, identifier) IN (SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?))''',
+            [status, json.dumps(keys)])
+
+
+    def _handle_fetch_status(self, feed: Feed):
+        """Recieves a change in whether a feed can be fetched."""
+        self._ingest_thread.execute(*database.update_feed_statement(feed))
+        self.feeds_updated_event.emit()
@@ -1,31 +1,33 @@
 from __future__ import annotations
-from heapq import heapify, heappop, heappush
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+import math
 import time
 import threading
 import queue
 import logging
-from typing import NamedTuple, Union
+from typing import Callable, Union
 
 
 from PySide6 import QtCore as qtc
 
-from feed import Feed, Folder, get_feed
+from feed import Feed, Folder, create_parse_pool, get_feed, session
+from analyzers.util import fetch, get_host
+from scheduler import RefreshSchedule
 from settings import Settings
 
 
-class Entry(NamedTuple):
-    time: float
-    scheduled: Feed | None  # a value of None indicates global refresh
-
-    def __lt__(self, other: Entry):
-        return self.time <= other.time
-
-# Entry = NamedTuple('Entry', ['scheduled', 'time'])
-
-
 class UpdateThread(qtc.QThread):
     """Thread which fetches data for the feed manager on a schedule.
 
+    Feeds are fetched in parallel by a pool of worker threads. At most settings.max_fetches fetches run at
+    once, and at most settings.max_host_fetches of those may be from the same host. Fetches from the same
+    host are started at least settings.global_refresh_rate seconds apart.
+    If settings.parse_processes is not 0, the worker threads only download the feeds, and the analyzers
+    are run in a pool of processes.
+
     Parameters
     ----------
 
@@ -34,88 +36,132 @@ class UpdateThread(qtc.QThread):
 
     settings
         the settings for the application.
+
+    known_articles
+        returns the updated time of each stored article of a feed by identifier, given the feed's db_id.
+        It is called from the fetch worker threads, so it must be thread safe.
     """
     data_downloaded_event = qtc.Signal(Feed, Feed, list)
-    download_error_event = qtc.Signal()
+    fetch_status_event = qtc.Signal(Feed)
+    "Fires when fetching a feed fails, or when a feed which was failing is fetched again."
 
 
-    def __init__(self, feeds: Folder, settings: Settings):
+    def __init__(self, feeds: Folder, settings: Settings, known_articles: Callable[[int], dict[str, datetime]]):
         qtc.QThread.__init__(self)
 
-        self.schedule: list[Entry] = []
+        self.schedule = RefreshSchedule(feeds, settings)
         self.schedule_update_event = threading.Event()
         self.feeds = feeds
         self.settings = settings
-        self.schedule_lock = threading.Lock()
+        self.known_articles = known_articles
         self.queue: queue.SimpleQueue[Feed] = queue.SimpleQueue()
 
-        for feed in self.feeds:
-            if feed.refresh_rate is not None and feed.refresh_rate != 0:
-                self.schedule.append(Entry(time.time() + feed.refresh_rate, feed))
-
-        # entry for global refresh
-        self.schedule.append(Entry(self.settings.refresh_time + time.time(), None))
-
-        heapify(self.schedule)
+        # fetch pool state, only used by the update thread itself
+        self.executor = ThreadPoolExecutor(self.settings.max_fetches, "fetch")
+        self.parse_pool = create_parse_pool()
+        self.pending: dict[str, deque[Feed]] = {}
+        self.queued: set[int] = set()
+        self.fetches = 0
+        self.host_fetches: dict[str, int] = {}
+        self.host_next_fetch: dict[str, float] = {}
+        self.finished: queue.SimpleQueue[tuple[str, Feed]] = queue.SimpleQueue()
 
 
     def run(self):
         while True:
             if self.isInterruptionRequested():
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                if self.parse_pool is not None:
+                    self.parse_pool.shutdown(wait=False, cancel_futures=True)
                 return
 
-            with self.schedule_lock:
-                
-                if self.schedule[0].time <= time.time():
-
-                    if type(self.schedule[0].scheduled) is Feed:
-                        heappop(self.schedule)
-                        feed = self.schedule[0].scheduled
-                        self.queue.put(feed)
-                        if feed.refresh_rate is not None and feed.refresh_rate != 0:
-                            heappush(self.schedule, Entry(feed.refresh_rate + time.time(), feed))
+            # cleared before handling anything, so that no wakeup which happens while handling is missed
+            self.schedule_update_event.clear()
 
-                    else:
-                        # global refresh
-                        self.queue_default_refresh(self.feeds)
-                        if self.settings.refresh_time != 0:
-                            heappush(self.schedule, Entry(self.settings.refresh_time + time.time(), None))
+            for feed in self.schedule.pop_due():
+                self.queue.put(feed)
 
-                    del self.schedule[0]
+            wake_time = min(self.schedule.next_time(), self.dispatch_fetches())
 
-            while not self.queue.empty():
-                feed = self.queue.get_nowait()
-                self.update_feed(feed)
-                if self.isInterruptionRequested():
-                    return
+            self.schedule_update_event.wait(None if wake_time == math.inf else wake_time - time.time())
 
-            self.schedule_update_event.wait(self.schedule[0].time - time.time())
-            self.schedule_update_event.clear()
 
-
-    def queue_default_refresh(self, folder: Folder | Feed):
-        """Adds all feeds which refresh at the default rate to the queue."""
-        for node in folder:
-            if type(node) is Folder:
-                self.queue_default_refresh(node)
-            else:
-                if node.refresh_rate is None:
-                    self.queue.put(node)
+    def stop(self) -> None:
+        """Stops the thread, waiting a short time for it to exit."""
+        self.requestInterruption()
+        self.schedule_update_event.set()
+        if self.wait(1000) is False:
+            logging.info("not enough time to stop update thread")
 
 
-    def update_feed(self, feed: Feed):
-        """Gets data for a feed in the queue.
+    def dispatch_fetches(self) -> float:
+        """Starts fetching queued feeds, as many as the concurrency limits allow.
 
-        Emits data_downloaded_event when the data is retrieved, then sleeps the thread
-        for the duration of the global_refresh_rate."""
+        Returns the earliest time a host with feeds still waiting is allowed to be fetched from again.
+        """
+        while not self.finished.empty():
+            host, feed = self.finished.get_nowait()
+            self.fetches -= 1
+            self.host_fetches[host] -= 1
+            self.queued.discard(feed.db_id)
+
+        while not self.queue.empty():
+            feed = self.queue.get_nowait()
+            # skip feeds which are already waiting or being fetched
+            if feed.db_id not in self.queued:
+                self.queued.add(feed.db_id)
+                self.pending.setdefault(get_host(feed.uri), deque()).append(feed)
+
+        wake_time = math.inf
+        now = time.time()
+        for host, feeds in list(self.pending.items()):
+            while (feeds
+                   and self.fetches < self.settings.max_fetches
+                   and self.host_fetches.get(host, 0) < self.settings.max_host_fetches):
+
+                if self.host_next_fetch.get(host, 0) > now:
+                    wake_time = min(wake_time, self.host_next_fetch[host])
+                    break
+
+                feed = feeds.popleft()
+                self.fetches += 1
+                self.host_fetches[host] = self.host_fetches.get(host, 0) + 1
+                self.host_next_fetch[host] = now + self.settings.global_refresh_rate
+                self.executor.submit(self.update_feed, feed, host)
+
+            if not feeds:
+                del self.pending[host]
+
+        return wake_time
+
+
+    def update_feed(self, feed: Feed, host: str):
+        """Gets data for a feed in the queue. Runs in a fetch worker thread.
+
+        Emits data_downloaded_event when the data is retrieved, unless the feed has not been modified
+        since it was last fetched. Then tells the update thread that the fetch from host has finished."""
         try:
             logging.debug(f"Fetching {feed.uri}")
-            updated_feed, articles = get_feed(feed.uri, feed.analyzer)
-            self.data_downloaded_event.emit(feed, updated_feed, articles)
+            known_articles = partial(self.known_articles, feed.db_id)
+            if self.parse_pool is None:
+                result = get_feed(feed.uri, feed.analyzer, feed.meta, None, known_articles)
+            else:
+                prefetched = {feed.uri: fetch(feed.uri, session, feed.meta)}
+                result = self.parse_pool.submit(get_feed, feed.uri, feed.analyzer, feed.meta, prefetched, known_articles).result()
+            if result is None:
+                logging.debug(f"{feed.uri} not modified")
+            else:
+                updated_feed, articles = result
+                self.data_downloaded_event.emit(feed, updated_feed, articles)
+            if self.schedule.record_success(feed):
+                self.fetch_status_event.emit(feed)
         except Exception as exc:
             logging.error(f"Error parsing feed {feed.uri}, {exc}")
-
-        time.sleep(self.settings.global_refresh_rate)
+            self.schedule.record_failure(feed, exc)
+            self.fetch_status_event.emit(feed)
+        finally:
+            self.finished.put((host, feed))
+            self.schedule_update_event.set()
 
 
     def force_refresh_folder(self, folder: Folder):
@@ -132,6 +178,12 @@ class UpdateThread(qtc.QThread):
         self.schedule_update_event.set()
 
 
+    def spread_refresh_folder(self, folder: Folder, window: float):
+        """Schedules all feeds in a folder to be refreshed within the next window seconds, spread out evenly."""
+        self.schedule.spread_refresh(list(folder), window)
+        self.schedule_update_event.set()
+
+
     def force_refresh_feed(self, feed: Feed):
         """Adds a feed to the update queue."""
         self.queue.put(feed)
@@ -143,16 +195,7 @@ class UpdateThread(qtc.QThread):
 
         Updates to the value should be changed using this function to avoid threading issues.
         """
-        with self.schedule_lock:
-            # delete the default refresh scheduler entry
-            if self.settings.refresh_time != 0:
-                i = next(i for (i, v) in enumerate(self.schedule) if v.scheduled is None)
-                del self.schedule[i]
-
-            self.settings.refresh_time = rate
-            if self.settings.refresh_time != 0:
-                heappush(self.schedule, Entry(self.settings.refresh_time + time.time(), None))
-
+        self.schedule.update_global_refresh_rate(rate)
         self.schedule_update_event.set()
 
 
@@ -160,21 +203,11 @@ class UpdateThread(qtc.QThread):
         """Updates the feed's refresh rate to the new value.
 
         Updates to the value should be changed using this function to avoid threading issues."""
-
-        with self.schedule_lock:
-            if feed.refresh_rate is not None and feed.refresh_rate != 0:
-                i = next(i for (i, v) in enumerate(self.schedule) if v.scheduled is not None and v.scheduled.db_id == feed.db_id)
-                del self.schedule[i]
-
-            feed.refresh_rate = rate
-            if feed.refresh_rate is not None and feed.refresh_rate != 0:
-                heappush(self.schedule, Entry(time.time() + feed.refresh_rate, feed))
-
+        self.schedule.update_refresh_rate(feed, rate)
         self.schedule_update_event.set()
 
 
     def remove_feed(self, feed: Feed) -> None:
         """Removes an item from the refresh schedule."""
-        i = next(i for (i, v) in enumerate(self.schedule) if v.scheduled is not None and v.scheduled.db_id == feed.db_id)
-        del self.schedule[i]
+        self.schedule.remove_feed(feed)
         self.schedule_update_event.set()
@@ -1,3 +1,4 @@
+from datetime import datetime, timedelta, timezone
 from typing import Any, Callable
 
 import PySide6.QtWidgets as qtw
@@ -81,10 +82,16 @@ class FeedView(qtw.QTreeView):
 
             if type(node) is Feed:
                 refresh = menu.addAction("Refresh Feed")
+                mark_read = menu.addAction("Mark Feed Read")
+                mark_older_read = menu.addAction("Mark Older Articles Read...")
                 delete = menu.addAction("Delete Feed")
                 options = menu.addAction("Feed Options...")
                 action = menu.exec(self.viewport().mapToGlobal(position))
-                if action == delete:
+                if action == mark_read:
+                    self.feed_manager.mark_read(node)
+                elif action == mark_older_read:
+                    self.prompt_mark_older_read(node)
+                elif action == delete:
                     self.prompt_delete_feed(index)
                 elif action == refresh:
                     self.refresh_single(node)
@@ -96,9 +103,15 @@ class FeedView(qtw.QTreeView):
                 add_feed = menu.addAction("Add Feed...")
                 add_folder = menu.addAction("Add Folder...")
                 rename_folder = menu.addAction("Rename...")
+                mark_read = menu.addAction("Mark Folder Read")
+                mark_older_read = menu.addAction("Mark Older Articles Read...")
                 delete_folder = menu.addAction("Delete Folder")
                 action = menu.exec(self.viewport().mapToGlobal(position))
-                if action == add_feed:
+                if action == mark_read:
+                    self.feed_manager.mark_read(node)
+                elif action == mark_older_read:
+                    self.prompt_mark_older_read(node)
+                elif action == add_feed:
                     self.prompt_add_feed(index)
                 elif action == add_folder:
                     self.prompt_add_folder(index)
@@ -183,6 +196,15 @@ class FeedView(qtw.QTreeView):
             self.feed_view_model.endRemoveRows()
 
 
+    def prompt_mark_older_read(self, scope: Feed | Folder | None = None) -> None:
+        """Opens a dialog asking how many days old articles must be, then marks those articles read.
+
+        If scope is None, the articles of all feeds are marked."""
+        days, accepted = qtw.QInputDialog.getInt(self, "Mark Older Articles Read", "Mark articles older than this many days read:", 7, 0)
+        if accepted:
+            self.feed_manager.mark_read(scope if scope is not None else self.feeds_cache, datetime.now(timezone.utc) - timedelta(days=days))
+
+
     def prompt_set_user_custom_title(self, index: qtc.QModelIndex) -> None:
         """
         Opens a dialog which allows the user to enter a custom title for a feed.
@@ -238,6 +260,12 @@ class FeedView(qtw.QTreeView):
             window.deleteTime.setValue(feed.delete_time)
             window.deleteTime.setEnabled(True)
 
+        window.maxArticlesCheck.setChecked(feed.max_articles is not None)
+        window.maxArticlesCheck.toggled.connect(window.maxArticles.setEnabled)
+        if feed.max_articles is not None:
+            window.maxArticles.setValue(feed.max_articles)
+            window.maxArticles.setEnabled(True)
+
         window.notifyCheck.setChecked(feed.ignore_new)
 
         window.setWindowFlags(qtc.Qt.WindowCloseButtonHint | qtc.Qt.WindowTitleHint)
@@ -249,6 +277,7 @@ class FeedView(qtw.QTreeView):
             data.user_title = window.customTitle.text() if window.customTitleCheck.isChecked() else None
             data.refresh_rate = window.refreshRate.value() if window.refreshRateCheck.isChecked() else None
             data.delete_time = window.deleteTime.value() if window.deleteTimeCheck.isChecked() else None
+            data.max_articles = window.maxArticles.value() if window.maxArticlesCheck.isChecked() else None
             data.ignore_new = window.notifyCheck.isChecked()
 
             self.feed_manager.update_feed(feed, data)
@@ -342,11 +371,15 @@ class FeedViewModel(qtc.QAbstractItemModel):
         node: Feed | Folder = index.internalPointer()
 
         if type(node) is Feed:
+            if role == qtc.Qt.ToolTipRole and node.failures > 0:
+                return f"{node.user_title if node.user_title is not None else node.title}\nFailed {node.failures} times: {node.last_error}"
             if role in (qtc.Qt.DisplayRole, qtc.Qt.ToolTipRole):
                 if index.column() == 0:
                     return node.user_title if node.user_title is not None else node.title
                 if index.column() == 1:
                     return node.unread_count
+            if role == qtc.Qt.ForegroundRole and node.failures >= settings.circuit_failures:
+                return qtg.QColor(qtc.Qt.gray)
 
         # must be a folder
         else:
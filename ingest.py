@@ -0,0 +1,202 @@
+from __future__ import annotations
+from datetime import datetime, timedelta, timezone
+import logging
+import math
+import queue
+import sqlite3
+import time
+from typing import Any, Iterable, Union
+
+from PySide6 import QtCore as qtc
+
+from feed import Article, ArticleData, Feed, FeedData
+from retention import Retention
+from settings import Settings
+import database
+
+
+Job = Union[tuple[Feed, Union[FeedData, None], list[ArticleData]], tuple[str, list[Any]]]
+"Downloaded data for a feed to be ingested, or a statement and its parameters to be executed."
+
+
+class IngestThread(qtc.QThread):
+    """Thread which makes all the writes to the database, so the GUI thread never waits for them.
+
+    The thread owns the only connection for writing. Results and statements which arrive while it is
+    busy are written together in one transaction, and then feed_ingested_event is emitted once for each
+    feed in the batch. Readers on other connections only ever see whole batches. If a batch can not be
+    written, its jobs are written again one at a time, so only the jobs which fail are lost.
+
+    Parameters
+    ----------
+
+    settings
+        the settings for the application.
+    """
+    feed_ingested_event = qtc.Signal(Feed, object, list, list, int)
+    """Fires for each feed which was written, with the feed, its new FeedData or None, the articles which
+    were added, the articles which were updated, and the feed's new unread count."""
+    unread_counts_event = qtc.Signal(object)
+    "Fires after a batch which executed statements, or after articles were deleted by retention, with the unread count of every feed by feed id."
+    search_index_event = qtc.Signal(int, int)
+    """Fires while articles stored before the search index existed are added to it, with the number of
+    articles left and the number there were to begin with."""
+
+    index_batch_size = 100
+    "The largest number of articles added to the search index in one transaction, while it is built."
+
+
+    def __init__(self, settings: Settings):
+        qtc.QThread.__init__(self)
+
+        self.settings = settings
+        self.retention = Retention(settings)
+        self.queue: queue.SimpleQueue[Job | None] = queue.SimpleQueue()
+        self.indexing = True
+        "Whether there may be articles left to add to the search index, which is done before retention."
+
+
+    def run(self):
+        connection = database.connect(self.settings.db_file)
+
+        stopping = False
+        while not stopping:
+            wait = 0 if self.indexing else self.retention.next_time() - time.time()
+            try:
+                batch = [self.queue.get(timeout=None if wait == math.inf else max(wait, 0))]
+            except queue.Empty:
+                if self.indexing:
+                    self.index(connection)
+                else:
+                    self.retain(connection)
+                continue
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            if None in batch:
+                stopping = True
+            jobs = [job for job in batch if job is not None]
+
+            if jobs:
+                self.write(connection, jobs)
+
+        connection.close()
+
+
+    def write(self, connection: sqlite3.Connection, jobs: list[Job]) -> None:
+        """Ingests a batch of jobs. If that fails, each job is ingested in a transaction of its own, so that
+        one bad job does not throw away the others, whose changes the GUI has already shown."""
+        try:
+            self.ingest(connection, jobs)
+            return
+        except Exception:
+            connection.rollback()
+            if len(jobs) == 1:
+                logging.exception("Error writing a job to the database")
+                return
+            logging.exception(f"Error writing {len(jobs)} jobs to the database, writing them one at a time")
+
+        for job in jobs:
+            try:
+                self.ingest(connection, [job])
+            except Exception:
+                connection.rollback()
+                logging.exception("Error writing a job to the database")
+
+
+    def index(self, connection: sqlite3.Connection) -> None:
+        """Adds batches of articles stored before the search index existed to it, for as long as a step of
+        retention may take, and emits search_index_event."""
+        deadline = time.time() + self.settings.retention_step_time
+        try:
+            progress = None
+            while time.time() < deadline:
+                with connection:
+                    progress = database.index_articles(connection, self.index_batch_size)
+                if progress is None or progress[0] == 0:
+                    self.indexing = False
+                    break
+            if progress is not None:
+                self.search_index_event.emit(*progress)
+        except Exception:
+            connection.rollback()
+            self.indexing = False
+            logging.exception("Error adding articles to the search index")
+
+
+    def retain(self, connection: sqlite3.Connection) -> None:
+        """Runs a step of retention, and emits unread_counts_event if any articles were deleted."""
+        try:
+            if self.retention.step(connection, time.time() + self.settings.retention_step_time) > 0:
+                self.unread_counts_event.emit({feed_id: row['unread'] for feed_id, row in database.get_feed_stats(connection).items()})
+        except Exception:
+            connection.rollback()
+            logging.exception("Error deleting old articles from the database")
+
+
+    def add(self, feed: Feed, data: FeedData | None, articles: list[ArticleData]) -> None:
+        """Queues a feed's downloaded data and articles to be written. Can be called from any thread."""
+        self.queue.put((feed, data, articles))
+
+
+    def execute(self, statement: str, parameters: list[Any]) -> None:
+        """Queues a statement to be executed. Can be called from any thread."""
+        self.queue.put((statement, parameters))
+
+
+    def set_retained_feeds(self, feeds: Iterable[Feed]) -> None:
+        """Sets the feeds whose old articles are deleted by retention. Should be called from the thread which
+        owns the feeds whenever they, or their delete_time or max_articles, change."""
+        self.retention.set_feeds(feeds)
+
+
+    def stop(self) -> None:
+        """Writes everything which is queued, then stops the thread."""
+        self.queue.put(None)
+        if self.wait(5000) is False:
+            logging.info("not enough time to stop ingest thread")
+
+
+    def ingest(self, connection: sqlite3.Connection, jobs: list[Job]):
+        """Writes a batch of jobs in one transaction, then emits feed_ingested_event for each feed.
+
+        Statements are executed first, in the order they were queued. Articles in the batch which are older
+        than their feed's delete time are left out, the ones in the database are deleted later by retention.
+        If an article already exists in the database, it is only updated if it has changed since."""
+        statements = [job for job in jobs if type(job[0]) is str]
+        for statement, parameters in statements:
+            connection.execute(statement, parameters)
+
+        results: list[tuple[Feed, FeedData | None, list[Article], list[Article]]] = []
+        for feed, data, articles in (job for job in jobs if type(job[0]) is Feed):
+            delete_time = feed.delete_time if feed.delete_time is not None else self.settings.default_delete_time
+
+            date_cutoff = datetime.now(timezone.utc) - timedelta(minutes=delete_time) if delete_time != 0 else None
+
+            known_ids = database.read_article_identifiers(connection, feed.db_id)
+
+            new_articles: list[Article] = []
+            updated_articles: list[Article] = []
+            for articledata in articles:
+                articledata.feed_id = feed.db_id
+                article = Article(articledata)
+
+                if date_cutoff is not None and article.updated < date_cutoff:
+                    continue
+
+                if article.identifier in known_ids:
+                    if article.updated > known_ids[article.identifier]:
+                        updated_articles.append(article)
+                else:
+                    new_articles.append(article)
+
+            results.append((feed, data, new_articles, updated_articles))
+
+        inserted, updated = database.upsert_articles(connection, [article for result in results for article in result[2] + result[3]])
+        logging.debug(f"{len(results)} feeds written: {inserted} articles added, {updated} updated")
+
+        for feed, data, new_articles, updated_articles in results:
+            self.feed_ingested_event.emit(feed, data, new_articles, updated_articles, database.count_unread(connection, feed.db_id))
+
+        if statements:
+            self.unread_counts_event.emit({feed_id: row['unread'] for feed_id, row in database.get_feed_stats(connection).items()})
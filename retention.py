@@ -0,0 +1,119 @@
+from __future__ import annotations
+from collections import deque
+import logging
+import math
+import sqlite3
+import time
+from typing import Iterable
+
+from feed import Feed
+from settings import Settings
+import database
+
+
+FeedLimits = tuple[int, int | None, int | None]
+"The db_id, delete_time and max_articles of a feed, copied from it so they can be read from any thread."
+
+
+class Retention:
+    """Deletes articles which feeds no longer keep, a small batch at a time, and then returns the freed
+    space to the file system. Used by the ingest thread when it has nothing else to write.
+
+    Every settings.retention_interval seconds, each feed is checked in turn. A feed keeps articles for
+    its delete_time, or settings.default_delete_time, in minutes, and keeps at most its max_articles, or
+    settings.default_max_articles, articles. 0 is no limit. Flagged articles are always kept, unless the
+    feed has been deleted, in which case all its articles are deleted.
+
+    The feeds are not read from the feed tree, which the GUI thread changes, but from a copy of their
+    limits made by set_feeds.
+
+    Parameters
+    ----------
+
+    settings
+        the settings for the application.
+    """
+
+    batch_size = 200
+    "The largest number of articles deleted in one transaction."
+
+    vacuum_pages = 256
+    "The largest number of free pages returned to the file system in one transaction."
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+
+        self.feeds: list[FeedLimits] = []
+        "The feeds whose articles are deleted. Replaced as a whole by set_feeds, and never changed in place."
+        self.pending: deque[FeedLimits] = deque()
+        "Feeds which have not been checked yet in this pass."
+        self.deleted_feeds: deque[int] = deque()
+        "Ids of deleted feeds whose articles have not all been deleted yet in this pass."
+        self.next_pass = time.time()
+        self.vacuum = False
+        "Whether articles were deleted in this pass, so there may be space to return."
+
+
+    def set_feeds(self, feeds: Iterable[Feed]) -> None:
+        """Copies the limits of the feeds whose articles are deleted. Called on the thread which owns the
+        feeds, and takes effect from the next pass."""
+        self.feeds = [(feed.db_id, feed.delete_time, feed.max_articles) for feed in feeds]
+
+
+    def next_time(self) -> float:
+        """Returns the time step should be called next, or infinity if retention is turned off."""
+        if self.pending or self.deleted_feeds or self.vacuum:
+            return time.time()
+        return self.next_pass if self.settings.retention_interval != 0 else math.inf
+
+
+    def step(self, connection: sqlite3.Connection, deadline: float) -> int:
+        """Deletes batches of articles until deadline, a time.time() value, or until the pass is finished.
+
+        Each batch is committed on its own, so the step can stop between any two of them. Once every feed
+        has been checked, free pages are returned to the file system until there are none left. Returns the
+        number of articles deleted."""
+        if not self.pending and not self.deleted_feeds and not self.vacuum and time.time() >= self.next_pass:
+            self.pending.extend(self.feeds)
+            self.deleted_feeds.extend(database.get_deleted_feed_ids(connection))
+            self.next_pass = time.time() + self.settings.retention_interval
+
+        deleted = 0
+        while self.deleted_feeds and time.time() < deadline:
+            with connection:
+                count = database.delete_feed_articles(connection, self.deleted_feeds[0], self.batch_size)
+            deleted += count
+            self.vacuum = True
+            if count < self.batch_size:
+                self.deleted_feeds.popleft()
+
+        while self.pending and time.time() < deadline:
+            feed_id, delete_time, max_articles = self.pending[0]
+            delete_time = delete_time if delete_time is not None else self.settings.default_delete_time
+            max_articles = max_articles if max_articles is not None else self.settings.default_max_articles
+
+            with connection:
+                count = database.delete_old_articles(
+                    connection,
+                    feed_id,
+                    time.time() - delete_time * 60 if delete_time != 0 else None,
+                    max_articles if max_articles != 0 else None,
+                    self.batch_size)
+
+            deleted += count
+            if count > 0:
+                self.vacuum = True
+            if count < self.batch_size:
+                self.pending.popleft()
+
+        free_pages = math.inf
+        while self.vacuum and not self.pending and not self.deleted_feeds and time.time() < deadline:
+            left = database.incremental_vacuum(connection, self.vacuum_pages)
+            # pages are not freed if the database is not in incremental auto vacuum mode
+            if left == 0 or left >= free_pages:
+                self.vacuum = False
+            free_pages = left
+
+        if deleted > 0:
+            logging.debug(f"retention deleted {deleted} articles, {len(self.pending)} feeds left to check")
+        return deleted
@@ -3,26 +3,30 @@ from PySide6.QtWidgets import QApplication
 
 import feed_manager
 import view
+from settings import settings
 
 
-# initialization
-app = QApplication([])
+# guarded so that processes spawned by the application do not start it again
+if __name__ == "__main__":
+    # initialization
+    app = QApplication([])
 
-logging.basicConfig(filename="data/log.txt", filemode="a", format="%(asctime)s %(levelname)s:%(message)s")
-feed_manager = feed_manager.FeedManager()
-view = view.View(feed_manager)
+    logging.basicConfig(filename="data/log.txt", filemode="a", format="%(asctime)s %(levelname)s:%(message)s")
+    feed_manager = feed_manager.FeedManager()
+    view = view.View(feed_manager)
 
 
-try:
-    # start program
-    app.exec()
+    try:
+        # start program
+        app.exec()
 
-    # cleanup
-    feed_manager.cleanup()
-    view.cleanup()
+        # cleanup
+        feed_manager.cleanup()
+        view.cleanup()
+        settings.cleanup()
 
-except BaseException as e:
-    logging.exception("Exception thrown!, ", e)
+    except BaseException as e:
+        logging.exception("Exception thrown!, ", e)
 
-app.quit()
-logging.shutdown()
+    app.quit()
+    logging.shutdown()
@@ -0,0 +1,348 @@
+from __future__ import annotations
+import math
+import random
+import time
+import threading
+from typing import Generic, Hashable, TypeVar, Union
+
+from feed import Feed, Folder
+from settings import Settings
+import database
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class IndexedHeap(Generic[K, V]):
+    """A binary min heap of values ordered by time, where each value has a unique key.
+
+    The position of each key in the heap is tracked, so entries can be rescheduled or removed by key in
+    O(log n) time. Entries with the same time come out in the order they were pushed.
+    """
+
+    def __init__(self):
+        self.heap: list[tuple[float, int, K, V]] = []
+        self.position: dict[K, int] = {}
+        self.counter = 0
+
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+
+    def __contains__(self, key: K) -> bool:
+        return key in self.position
+
+
+    def peek_time(self) -> float:
+        """Returns the time of the earliest entry, or infinity if the heap is empty."""
+        return self.heap[0][0] if self.heap else math.inf
+
+
+    def push(self, key: K, value: V, time: float) -> None:
+        """Adds an entry, or reschedules it if there already is an entry with the key."""
+        self.counter += 1
+        item = (time, self.counter, key, value)
+        i = self.position.get(key)
+        if i is None:
+            self.heap.append(item)
+            self.position[key] = len(self.heap) - 1
+            self._sift_up(len(self.heap) - 1)
+        else:
+            old_time = self.heap[i][0]
+            self.heap[i] = item
+            if time < old_time:
+                self._sift_up(i)
+            else:
+                self._sift_down(i)
+
+
+    def pop(self) -> tuple[K, V, float]:
+        """Removes and returns the key, value and time of the earliest entry."""
+        time, _, key, value = self.heap[0]
+        self._remove_at(0)
+        return key, value, time
+
+
+    def remove(self, key: K) -> bool:
+        """Removes the entry with the key. Returns whether there was one."""
+        i = self.position.get(key)
+        if i is None:
+            return False
+        self._remove_at(i)
+        return True
+
+
+    def _remove_at(self, i: int) -> None:
+        del self.position[self.heap[i][2]]
+        last = self.heap.pop()
+        if i < len(self.heap):
+            self.heap[i] = last
+            self.position[last[2]] = i
+            # the moved entry may belong either above or below its new position
+            self._sift_up(i)
+            self._sift_down(self.position[last[2]])
+
+
+    def _sift_up(self, i: int) -> None:
+        heap = self.heap
+        item = heap[i]
+        while i > 0:
+            parent = (i - 1) // 2
+            if heap[parent] < item:
+                break
+            heap[i] = heap[parent]
+            self.position[heap[i][2]] = i
+            i = parent
+        heap[i] = item
+        self.position[item[2]] = i
+
+
+    def _sift_down(self, i: int) -> None:
+        heap = self.heap
+        item = heap[i]
+        size = len(heap)
+        while True:
+            child = 2 * i + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1] < heap[child]:
+                child += 1
+            if item < heap[child]:
+                break
+            heap[i] = heap[child]
+            self.position[heap[i][2]] = i
+            i = child
+        heap[i] = item
+        self.position[item[2]] = i
+
+
+class RefreshSchedule:
+    """Keeps track of when feeds should be refreshed. Used by the fetch engines, and does not depend on Qt.
+
+    Feeds with their own refresh rate have their own entry in the schedule. All other feeds are refreshed
+    by the global entry, every settings.refresh_time seconds. Rather than refreshing all of them at once,
+    the global entry spreads them out over the time until it fires again, see spread_refresh.
+
+    When fetching a feed fails, it is not refreshed on schedule again until a backoff time has passed,
+    see record_failure.
+
+    If settings.adaptive_refresh is set, feeds without their own refresh rate instead get an entry with a
+    rate learned from how often articles are posted to them, see adaptive_rate. Feeds which do not have
+    enough articles to learn from stay with the global refresh. The rates are read from the database by
+    pop_due, without the lock held, so other threads never wait for the database.
+
+    All methods are thread safe.
+
+    Parameters
+    ----------
+
+    feeds
+        a Folder containing all the feeds that will be in the scheduler.
+
+    settings
+        the settings for the application.
+    """
+
+    def __init__(self, feeds: Folder, settings: Settings):
+        self.entries: IndexedHeap[int | None, Feed | None] = IndexedHeap()
+        "Scheduled refreshes keyed by feed db_id, with the key None and no feed for the global refresh."
+        self.feeds = feeds
+        self.settings = settings
+        self.lock = threading.Lock()
+
+        self.adaptive: set[int] = set()
+        "db_ids of the feeds which are scheduled with an adaptive rate."
+        self.adaptive_pending: dict[int, Feed] = {}
+        "Feeds by db_id whose adaptive rate is looked up the next time pop_due is called."
+        self.removed: set[int] = set()
+        "db_ids of the feeds which were removed, so that a rate being looked up does not schedule them again."
+
+        for feed in self.feeds:
+            if feed.refresh_rate is not None and feed.refresh_rate != 0:
+                self.entries.push(feed.db_id, feed, time.time() + feed.refresh_rate)
+
+        self.request_adaptive(self.global_refresh_feeds())
+
+        # entry for global refresh. Its first round starts refresh_time from now, feeds are only refreshed
+        # at startup if settings.startup_update is set
+        if self.settings.refresh_time != 0:
+            self.entries.push(None, None, self.settings.refresh_time + time.time())
+
+
+    def next_time(self) -> float:
+        """Returns the time of the next scheduled refresh, or infinity if there is none."""
+        with self.lock:
+            if self.adaptive_pending:
+                return time.time()
+            return self.entries.peek_time()
+
+
+    def pop_due(self) -> list[Feed]:
+        """Returns all feeds which are due to be refreshed, and schedules their next refresh.
+
+        Feeds which are backing off after failures are left out."""
+        due: list[Feed] = []
+        global_due = False
+        with self.lock:
+            lookup = self.adaptive_pending
+            self.adaptive_pending = {}
+
+            while self.entries.peek_time() <= time.time():
+                _, feed, _ = self.entries.pop()
+
+                if feed is not None:
+                    due.append(feed)
+                    if feed.refresh_rate is not None and feed.refresh_rate != 0:
+                        self.entries.push(feed.db_id, feed, feed.refresh_rate + time.time())
+                    elif feed.db_id in self.adaptive:
+                        self.adaptive.discard(feed.db_id)
+                        lookup[feed.db_id] = feed
+                else:
+                    global_due = True
+
+            if global_due and self.settings.adaptive_refresh:
+                lookup.update((feed.db_id, feed) for feed in self.global_refresh_feeds())
+
+        intervals = self.publish_intervals(list(lookup.values()))
+
+        with self.lock:
+            self.schedule_adaptive(list(lookup.values()), intervals)
+            if global_due and self.settings.refresh_time != 0:
+                # global refresh, the feeds are given their own entries spread over the next round
+                self.entries.push(None, None, self.settings.refresh_time + time.time())
+                self._spread(self.global_refresh_feeds(), self.settings.refresh_time)
+
+        now = time.time()
+        return [feed for feed in due if feed.retry_time <= now]
+
+
+    def record_failure(self, feed: Feed, error: Exception) -> None:
+        """Updates the feed's fetch status after fetching it failed, and sets the time it may be retried.
+
+        The time to wait starts at settings.failure_backoff and doubles after each failure in a row, up to
+        settings.failure_max_backoff. After settings.circuit_failures failures in a row the feed is
+        considered broken, and is only tried once every settings.failure_max_backoff seconds.
+        A Retry-After time sent by the server is waited for if it is longer.
+        """
+        feed.failures += 1
+        feed.last_error = str(error)
+
+        if feed.failures >= self.settings.circuit_failures:
+            delay = self.settings.failure_max_backoff
+        else:
+            delay = min(self.settings.failure_backoff * 2 ** (feed.failures - 1), self.settings.failure_max_backoff)
+
+        retry_after: float | None = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        feed.retry_time = time.time() + delay
+
+
+    def record_success(self, feed: Feed) -> bool:
+        """Clears the feed's fetch status after fetching it worked. Returns whether the status changed."""
+        if feed.failures == 0:
+            return False
+        feed.failures = 0
+        feed.retry_time = 0
+        feed.last_error = None
+        return True
+
+
+    def spread_refresh(self, feeds: list[Feed], window: float) -> None:
+        """Schedules each feed to be refreshed once within the next window seconds.
+
+        Each feed is refreshed at a fixed point in the window, found from its db_id, so that feeds are
+        spread evenly over the window and each is refreshed at about the same point in every round.
+        settings.refresh_jitter moves each feed by a random amount, up to that fraction of the window.
+        """
+        with self.lock:
+            self._spread(feeds, window)
+
+
+    def _spread(self, feeds: list[Feed], window: float) -> None:
+        now = time.time()
+        for feed in feeds:
+            # multiples of the golden ratio spread consecutive ids evenly, whatever the number of feeds
+            phase = feed.db_id * 0.6180339887498949 + random.random() * self.settings.refresh_jitter
+            self.entries.push(feed.db_id, feed, now + window * (phase % 1))
+
+
+    def global_refresh_feeds(self) -> list[Feed]:
+        """Returns all feeds which are refreshed by the global refresh."""
+        return [feed for feed in self.feeds if feed.refresh_rate is None and feed.db_id not in self.adaptive]
+
+
+    def adaptive_rate(self, interval: float) -> float:
+        """Returns the refresh rate for a feed which gets new articles every interval seconds on average.
+
+        Feeds are refreshed about twice per interval, bounded by settings.adaptive_min_refresh and
+        settings.adaptive_max_refresh.
+        """
+        return min(max(interval / 2, self.settings.adaptive_min_refresh), self.settings.adaptive_max_refresh)
+
+
+    def request_adaptive(self, feeds: list[Feed]) -> None:
+        """Has the adaptive rate of the feeds looked up the next time pop_due is called, if adaptive refresh
+        is on. Should be called with the lock held, or before the schedule is in use."""
+        if self.settings.adaptive_refresh:
+            self.adaptive_pending.update((feed.db_id, feed) for feed in feeds)
+
+
+    def publish_intervals(self, feeds: list[Feed]) -> dict[int, float]:
+        """Reads the publish intervals of the feeds from the database, see database.get_publish_intervals.
+        Should be called without the lock held."""
+        if not self.settings.adaptive_refresh or not feeds:
+            return {}
+        if len(feeds) == 1:
+            return database.get_publish_intervals(self.settings.db_file, feeds[0].db_id)
+        return database.get_publish_intervals(self.settings.db_file)
+
+
+    def schedule_adaptive(self, feeds: list[Feed], intervals: dict[int, float]) -> None:
+        """Gives the feeds which have a publish interval in intervals an adaptive entry.
+
+        Feeds which were given their own refresh rate or removed since the intervals were read are left
+        out. Should be called with the lock held.
+        """
+        for feed in feeds:
+            if feed.db_id in intervals and feed.refresh_rate is None and feed.db_id not in self.removed:
+                self.adaptive.add(feed.db_id)
+                self.entries.push(feed.db_id, feed, self.adaptive_rate(intervals[feed.db_id]) + time.time())
+
+
+    def update_global_refresh_rate(self, rate: int):
+        """Updates the global refresh rate to the new value, and reschedules the global refresh."""
+        with self.lock:
+            self.settings.refresh_time = rate
+            if self.settings.refresh_time != 0:
+                self.entries.push(None, None, self.settings.refresh_time + time.time())
+            else:
+                self.entries.remove(None)
+
+
+    def update_refresh_rate(self, feed: Feed, rate: Union[int, None]):
+        """Updates the feed's refresh rate to the new value, and reschedules the feed."""
+        with self.lock:
+            self.adaptive.discard(feed.db_id)
+            self.adaptive_pending.pop(feed.db_id, None)
+
+            feed.refresh_rate = rate
+            if feed.refresh_rate is not None and feed.refresh_rate != 0:
+                self.entries.push(feed.db_id, feed, time.time() + feed.refresh_rate)
+            else:
+                self.entries.remove(feed.db_id)
+
+            if feed.refresh_rate is None:
+                self.request_adaptive([feed])
+
+
+    def remove_feed(self, feed: Feed) -> None:
+        """Removes a feed from the schedule."""
+        with self.lock:
+            self.entries.remove(feed.db_id)
+            self.adaptive.discard(feed.db_id)
+            self.adaptive_pending.pop(feed.db_id, None)
+            self.removed.add(feed.db_id)
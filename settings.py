@@ -1,9 +1,11 @@
 import json
-import os.path
+import os
 import logging
+import threading
 
-from shutil import copyfile, move
-from typing import Any
+from contextlib import contextmanager
+from shutil import copyfile
+from typing import Any, Iterator
 
 
 _settings_file = "data/settings.json"
@@ -12,6 +14,15 @@ _default_settings_file = "data/defaultsettings.json"
 
 
 class Settings():
+    """The settings of the application, read from the settings file once when created.
+
+    Reading a setting never touches the disk. Changing one marks the settings dirty, and they are written
+    to the settings file by a background thread save_delay seconds later, so several changes in a row are
+    written once. Changes made inside batch are never written separately. cleanup writes any changes
+    which have not been written yet."""
+
+    save_delay = 1.0
+    "Seconds between a setting being changed and the settings being written."
 
     def __init__(self):
         """Initializes settings for the application.
@@ -23,9 +34,13 @@ class Settings():
             copyfile(_default_settings_file, _settings_file)
 
         try:
+            # settings missing from the settings file, such as ones added in newer versions, use the defaults
+            with open(_default_settings_file, "rb") as default_settings_file:
+                settings = json.loads(default_settings_file.read().decode("utf-8"))
+
             with open(_settings_file, "rb") as settings_file:
                 contents = settings_file.read().decode("utf-8")
-                settings = json.loads(contents)
+                settings.update(json.loads(contents))
 
         except OSError as error:
             logging.exception("Error reading settings file!")
@@ -34,8 +49,8 @@ class Settings():
         self.db_file: str = settings["db_file"]
         self.refresh_time: int = settings["refresh_time"]
         self.default_delete_time: int = settings["default_delete_time"]
+        self.default_max_articles: int = settings["default_max_articles"]
         self.global_refresh_rate: int = settings["global_refresh_rate"]
-        self.feed_counter: int = settings["feed_counter"]
         self.font_size: int = settings["font_size"]
         self.startup_update: bool = settings["startup_update"]
         self.geometry: str = settings["geometry"]
@@ -44,19 +59,101 @@ class Settings():
         self.article_view_headers: str = settings["article_view_headers"]
         self.feed_view_headers: str = settings["feed_view_headers"]
         self.state: str = settings["state"]
+        self.max_fetches: int = settings["max_fetches"]
+        self.max_host_fetches: int = settings["max_host_fetches"]
+        self.fetch_engine: str = settings["fetch_engine"]
+        self.parse_processes: int = settings["parse_processes"]
+        self.adaptive_refresh: bool = settings["adaptive_refresh"]
+        self.adaptive_min_refresh: int = settings["adaptive_min_refresh"]
+        self.adaptive_max_refresh: int = settings["adaptive_max_refresh"]
+        self.failure_backoff: int = settings["failure_backoff"]
+        self.failure_max_backoff: int = settings["failure_max_backoff"]
+        self.circuit_failures: int = settings["circuit_failures"]
+        self.refresh_jitter: float = settings["refresh_jitter"]
+        self.startup_refresh_window: float = settings["startup_refresh_window"]
+        self.db_readers: int = settings["db_readers"]
+        self.db_shared_cache: bool = settings["db_shared_cache"]
+        self.retention_interval: int = settings["retention_interval"]
+        self.retention_step_time: float = settings["retention_step_time"]
+
+        self._lock = threading.RLock()
+        "Held while settings are changed or written."
+        self._dirty = False
+        self._save_timer: threading.Timer | None = None
+        self._batch_depth = 0
+        self._loaded = True
 
 
     def __setattr__(self, name: str, value: Any):
-        super().__setattr__(name, value)
-        self.save_settings()
+        # nothing has changed while the settings are being loaded. This also keeps processes which only
+        # read the settings, such as the parse processes, from writing to the file.
+        if "_loaded" not in vars(self) or name.startswith("_"):
+            super().__setattr__(name, value)
+            return
+
+        with self._lock:
+            if name in vars(self) and vars(self)[name] == value:
+                return
+            super().__setattr__(name, value)
+            self._dirty = True
+            if self._batch_depth == 0:
+                self._schedule_save()
+
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Context in which changed settings are written together, once the outermost batch ends. Until
+        then, settings are not written by the background thread either, so only all the changes are."""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0 and self._dirty:
+                    self._schedule_save()
 
 
     def save_settings(self):
-        """Outputs settings to file."""
-        value = json.dumps(vars(self), indent=4)
-        with open(_writing_settings_file, "w") as settings_file:
-            settings_file.write(value)
-        move(_writing_settings_file, _settings_file)
+        """Writes the settings to file now, if any have changed since they were last written."""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._dirty:
+                return
+            value = json.dumps({k: v for k, v in vars(self).items() if not k.startswith("_")}, indent=4)
+            # the whole file is replaced at once, so it is never left half written
+            try:
+                with open(_writing_settings_file, "w") as settings_file:
+                    settings_file.write(value)
+                os.replace(_writing_settings_file, _settings_file)
+                self._dirty = False
+            except OSError:
+                logging.exception("Error writing settings file!")
+
+
+    def cleanup(self):
+        """Writes any settings which have not been written yet."""
+        self.save_settings()
+
+
+    def _save_unless_batched(self):
+        """Writes the settings from the timer, unless a batch has started since it was started. The batch
+        starts the timer again when it ends."""
+        with self._lock:
+            self._save_timer = None
+            if self._batch_depth == 0:
+                self.save_settings()
+
+
+    def _schedule_save(self):
+        """Starts the timer which writes the settings, unless it has already been started."""
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self.save_delay, self._save_unless_batched)
+            self._save_timer.daemon = True
+            self._save_timer.start()
 
 
 settings = Settings()
@@ -9,8 +9,28 @@ def check_str(item: Any) -> str:
     raise Exception("")
 
 
+_plain_types: dict[Any, bool] = {}
+"Whether each type passed to check_type can be checked with isinstance."
+
+
 def check_type(check: Type[T], item: Any) -> T:
-    typeguard_check_type(str(check), item, check)
+    """Raises TypeError if item is not of the type check, otherwise returns it.
+
+    Classes and unions of classes are checked with isinstance, which is much faster than typeguard.
+    Other types, such as dict[str, Any], are checked with typeguard."""
+    plain = _plain_types.get(check)
+    if plain is None:
+        try:
+            isinstance(None, check)
+            plain = True
+        except TypeError:
+            plain = False
+        _plain_types[check] = plain
+
+    if not plain:
+        typeguard_check_type(str(check), item, check)
+    elif not isinstance(item, check):
+        raise TypeError(f"type of {check} must be {check}; got {type(item).__qualname__} instead")
     return item
 
 
@@ -7,7 +7,7 @@ from feed import Feed, Article, Folder
 import feed_manager
 from settings import settings
 from feed_view import FeedView
-from article_view import ArticleView
+from article_view import ArticleFilter
 
 
 class View(qtw.QMainWindow):
@@ -19,7 +19,8 @@ class View(qtw.QMainWindow):
 
         self.feed_manager = mgr
 
-        self.article_view = ArticleView(self.feed_manager)
+        self.article_filter = ArticleFilter(self.feed_manager)
+        self.article_view = self.article_filter.article_view
         self.feed_view = FeedView(self.feed_manager)
         self.content_view = TBrowser()
         self.article_content_splitter = qtw.QSplitter(qtc.Qt.Vertical)
@@ -35,7 +36,7 @@ class View(qtw.QMainWindow):
 
         self.content_view.setOpenExternalLinks(True)
 
-        self.article_content_splitter.addWidget(self.article_view)
+        self.article_content_splitter.addWidget(self.article_filter)
         self.article_content_splitter.addWidget(self.content_view)
         self.feed_rhs_splitter.addWidget(self.feed_view)
         self.feed_rhs_splitter.addWidget(self.article_content_splitter)
@@ -51,6 +52,8 @@ class View(qtw.QMainWindow):
         menu_bar.addAction("Add root feed...").triggered.connect(self.feed_view.prompt_add_feed)
         menu_bar.addAction("Add root folder...").triggered.connect(self.feed_view.prompt_add_folder)
         menu_bar.addAction("Update All Feeds").triggered.connect(self.refresh_all)
+        menu_bar.addAction("Mark All Read").triggered.connect(self.mark_all_read)
+        menu_bar.addAction("Mark Older Articles Read...").triggered.connect(lambda: self.feed_view.prompt_mark_older_read())
         menu_bar.addAction("Settings...").triggered.connect(self.settings_dialog)
         menu_bar.addSeparator()
         menu_bar.addAction("Exit").triggered.connect(qtc.QCoreApplication.quit)
@@ -88,12 +91,13 @@ class View(qtw.QMainWindow):
 
     def cleanup(self) -> None:
         """Saves panel states into settings."""
-        settings.geometry = str(self.saveGeometry().toBase64(), 'utf-8')
-        settings.state = str(self.saveState().toBase64(), 'utf-8')
-        settings.splitter1 = str(self.article_content_splitter.saveState().toBase64(), 'utf-8')
-        settings.splitter2 = str(self.feed_rhs_splitter.saveState().toBase64(), 'utf-8')
-        self.article_view.cleanup()
-        self.feed_view.cleanup()
+        with settings.batch():
+            settings.geometry = str(self.saveGeometry().toBase64(), 'utf-8')
+            settings.state = str(self.saveState().toBase64(), 'utf-8')
+            settings.splitter1 = str(self.article_content_splitter.saveState().toBase64(), 'utf-8')
+            settings.splitter2 = str(self.feed_rhs_splitter.saveState().toBase64(), 'utf-8')
+            self.article_view.cleanup()
+            self.feed_view.cleanup()
 
 
     def refresh_all(self) -> None:
@@ -104,6 +108,11 @@ class View(qtw.QMainWindow):
         self.feed_manager.refresh_all()
 
 
+    def mark_all_read(self) -> None:
+        """Tells the feed manager to mark the articles of all feeds read."""
+        self.feed_manager.mark_read(self.feed_manager.feed_cache)
+
+
 
     def hideEvent(self, event: qtg.QHideEvent):
         self.hide()
@@ -149,7 +158,7 @@ class View(qtw.QMainWindow):
 
     def output_content(self, article: Article) -> None:
         """Outputs html content to the content view."""
-        self.content_view.setHtml(article.content)
+        self.content_view.setHtml(self.feed_manager.get_article_content(article))
 
 
     def settings_dialog(self) -> None:
@@ -160,6 +169,7 @@ class View(qtw.QMainWindow):
         window.globalRefresh.setValue(settings.refresh_time)
         window.globalRefreshDelay.setValue(settings.global_refresh_rate)
         window.deleteTime.setValue(settings.default_delete_time)
+        window.maxArticles.setValue(settings.default_max_articles)
         window.fontSize.setValue(settings.font_size)
         window.startupUpdate.setChecked(settings.startup_update)
 
@@ -167,23 +177,26 @@ class View(qtw.QMainWindow):
 
         window.show()
         if window.exec() == qtw.QDialog.Accepted:
+            with settings.batch():
+                if window.globalRefresh.value() != settings.refresh_time:
+                    self.feed_manager.set_default_refresh_rate(window.globalRefresh.value())
 
-            if window.globalRefresh.value() != settings.refresh_time:
-                self.feed_manager.set_default_refresh_rate(window.globalRefresh.value())
+                if window.globalRefreshDelay.value() != settings.global_refresh_rate:
+                    settings.global_refresh_rate = window.globalRefreshDelay.value()
 
-            if window.globalRefreshDelay.value() != settings.global_refresh_rate:
-                settings.global_refresh_rate = window.globalRefreshDelay.value()
+                if window.deleteTime.value() != settings.default_delete_time:
+                    settings.default_delete_time = window.deleteTime.value()
 
-            if window.deleteTime.value() != settings.default_delete_time:
-                settings.default_delete_time = window.deleteTime.value()
+                if window.maxArticles.value() != settings.default_max_articles:
+                    settings.default_max_articles = window.maxArticles.value()
 
-            if window.fontSize.value() != settings.font_size:
-                settings.font_size = window.fontSize.value()
-                self.article_view.update_all_data()
-                self.feed_view.update_all_data()
+                if window.fontSize.value() != settings.font_size:
+                    settings.font_size = window.fontSize.value()
+                    self.article_view.update_all_data()
+                    self.feed_view.update_all_data()
 
-            if window.startupUpdate.isChecked() != settings.startup_update:
-                settings.startup_update = window.startupUpdate.isChecked()
+                if window.startupUpdate.isChecked() != settings.startup_update:
+                    settings.startup_update = window.startupUpdate.isChecked()
 
 
 class TBrowser(qtw.QTextBrowser):